@@ -0,0 +1,487 @@
+# Snapshot columnar en memoria de proyecto, propiedad y renta (SNAPSHOT_MODE=1 en main.py)
+# verificar paridad contra SQL = python3 columnar.py --verify
+
+import re
+import sys
+import math
+import time
+import random
+import threading
+import numpy as np
+from datetime import date
+
+# Se lee de nuevo una ventana de SNAPSHOT_LAG segundos en cada refresco incremental para no perder
+# transacciones que terminaron después del refresco anterior con un updated_at más viejo. Las transacciones
+# más largas (cargas masivas) cambian la generación y provocan una recarga completa
+SNAPSHOT_LAG = 60
+MAX_BITMAP_CARDINALITY = 256
+NULL_SORT_KEY = np.iinfo(np.int64).max  # NULLS LAST, igual que ORDER BY ascendente en PostgreSQL
+ISO_DATE = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+SPECS = {
+    # Una fila por combinación proyecto/sociedad/ubicación, igual que los LEFT JOIN de /proyectos
+    'proyecto': {
+        'columns': [
+            ('id', 'int'),
+            ('clave', 'str'),
+            ('prioridad', 'int'),
+            ('nombre', 'str'),
+            ('superficie_total', 'float'),
+            ('propietario', 'str'),
+            ('tipo_propiedad', 'str'),
+            ('socios', 'str'),
+            ('rfc', 'str'),
+            ('tiene_garantia', 'bool'),
+            ('vocacion', 'str'),
+            ('vocacion_especifica', 'str'),
+            ('responsable', 'str'),
+            ('estatus_activo_no_activo', 'str'),
+            ('categoria', 'str'),
+            ('comentarios', 'object'),
+            ('abogado', 'str'),
+            ('created_at', 'object'),
+            ('updated_at', 'object'),
+            ('sociedad_id', 'int'),
+            ('ubicacion_id', 'int'),
+            ('estatus_legal_id', 'int')
+        ],
+        'select': """
+            SELECT
+                p.id, p.clave, p.prioridad, p.nombre, p.superficie_total, p.propietario, p.tipo_propiedad,
+                p.socios, p.rfc, p.tiene_garantia, p.vocacion, p.vocacion_especifica, p.responsable,
+                p.estatus_activo_no_activo, p.categoria, p.comentarios, p.abogado, p.created_at, p.updated_at,
+                s.id AS sociedad_id,
+                u.id AS ubicacion_id,
+                e.id AS estatus_legal_id
+            FROM proyecto p
+            LEFT JOIN proyecto_sociedad ps ON p.id = ps.proyecto_id
+            LEFT JOIN sociedad s ON ps.sociedad_id = s.id
+            LEFT JOIN proyecto_estatus_ubicacion peu ON p.id = peu.proyecto_id
+            LEFT JOIN ubicacion u ON peu.ubicacion_id = u.id
+            LEFT JOIN estatus_legal e ON peu.estatus_legal_id = e.id
+        """,
+        'changed': """
+            WHERE p.id IN (
+                SELECT id FROM proyecto WHERE updated_at >= %(since)s
+                UNION SELECT proyecto_id FROM proyecto_sociedad WHERE updated_at >= %(since)s
+                UNION SELECT proyecto_id FROM proyecto_estatus_ubicacion WHERE updated_at >= %(since)s
+            )
+        """,
+        'keys': "SELECT id FROM proyecto;",
+        'key': 'id',
+        'order': ('id', 'sociedad_id', 'ubicacion_id', 'estatus_legal_id'),
+        'bitmaps': ('tipo_propiedad', 'tiene_garantia', 'vocacion', 'vocacion_especifica', 'responsable', 'estatus_activo_no_activo', 'categoria', 'abogado'),
+        'filters': {'sociedad': 'sociedad_id', 'estatus_legal': 'estatus_legal_id', 'ubicacion': 'ubicacion_id'}
+    },
+    'propiedad': {
+        'columns': [
+            ('id', 'int'),
+            ('clave', 'str'),
+            ('nombre', 'str'),
+            ('superficie', 'float'),
+            ('valor_comercial', 'float'),
+            ('valor_comercial_usd', 'float'),
+            ('anio_valor_comercial', 'int'),
+            ('clave_catastral', 'str'),
+            ('base_predial', 'float'),
+            ('adeudo_predial', 'float'),
+            ('anios_pend_predial', 'int'),
+            ('comentarios', 'object'),
+            ('proyecto_id', 'int'),
+            ('created_at', 'object'),
+            ('updated_at', 'object')
+        ],
+        'select': """
+            SELECT
+                id, clave, nombre, superficie, valor_comercial, valor_comercial_usd, anio_valor_comercial,
+                clave_catastral, base_predial, adeudo_predial, anios_pend_predial, comentarios, proyecto_id,
+                created_at, updated_at
+            FROM propiedad
+        """,
+        'changed': "WHERE updated_at >= %(since)s",
+        'keys': "SELECT id FROM propiedad;",
+        'key': 'id',
+        'order': ('id',),
+        'bitmaps': ('anio_valor_comercial', 'anios_pend_predial', 'proyecto_id'),
+        'filters': {}
+    },
+    'renta': {
+        'columns': [
+            ('id', 'int'),
+            ('nombre_comercial', 'str'),
+            ('razon_social', 'str'),
+            ('renta_iva_incluida', 'float'),
+            ('deposito_garantia_concepto', 'str'),
+            ('deposito_garantia_renta', 'float'),
+            ('meses_gracia_concepto', 'str'),
+            ('meses_gracia_fecha_inicio', 'date'),
+            ('meses_gracia_fecha_fin', 'date'),
+            ('renta_anticipada_concepto', 'str'),
+            ('renta_anticipada_fecha_inicio', 'date'),
+            ('renta_anticipada_fecha_fin', 'date'),
+            ('renta_anticipada_renta_iva_incluida', 'float'),
+            ('incremento_mes', 'str'),
+            ('incremento_descripcion', 'str'),
+            ('inicio_vigencia', 'date'),
+            ('fin_vigencia_forzosa', 'date'),
+            ('fin_vigencia_no_forzosa', 'date'),
+            ('vigencia', 'str'),
+            ('tiempo_restante', 'str'),
+            ('incidencias', 'object'),
+            ('created_at', 'object'),
+            ('updated_at', 'object')
+        ],
+        'select': """
+            SELECT
+                id, nombre_comercial, razon_social, renta_iva_incluida, deposito_garantia_concepto,
+                deposito_garantia_renta, meses_gracia_concepto, meses_gracia_fecha_inicio, meses_gracia_fecha_fin,
+                renta_anticipada_concepto, renta_anticipada_fecha_inicio, renta_anticipada_fecha_fin,
+                renta_anticipada_renta_iva_incluida, incremento_mes, incremento_descripcion, inicio_vigencia,
+                fin_vigencia_forzosa, fin_vigencia_no_forzosa, vigencia, tiempo_restante, incidencias,
+                created_at, updated_at
+            FROM renta
+        """,
+        'changed': "WHERE updated_at >= %(since)s",
+        'keys': "SELECT id FROM renta;",
+        'key': 'id',
+        'order': ('id',),
+        'bitmaps': ('incremento_mes', 'vigencia', 'tiempo_restante'),
+        'filters': {}
+    }
+}
+
+
+class UnsupportedFilter(Exception):
+    pass
+
+
+class SnapshotData:
+    # Una versión del snapshot; nunca se modifica después de publicarse, los refrescos crean otra
+    def __init__(self, size, values, nulls, dictionaries, lookups):
+        self.size = size
+        self.values = values
+        self.nulls = nulls
+        self.dictionaries = dictionaries
+        self.lookups = lookups
+        self.bitmaps = {}
+
+
+def encode_rows(rows, spec, dictionaries, lookups):
+    # Convierte filas de psycopg2 en un arreglo por columna; los textos se codifican contra el diccionario
+    size = len(rows)
+    values = {}
+    nulls = {}
+    for position, (column, kind) in enumerate(spec['columns']):
+        raw = [row[position] for row in rows]
+        null = np.fromiter((value is None for value in raw), dtype=bool, count=size)
+        if kind == 'str':
+            dictionary = dictionaries[column]
+            lookup = lookups[column]
+            codes = np.empty(size, dtype=np.int32)
+            for index, value in enumerate(raw):
+                if value is None:
+                    codes[index] = -1
+                    continue
+                code = lookup.get(value)
+                if code is None:
+                    code = lookup[value] = len(dictionary)
+                    dictionary.append(value)
+                codes[index] = code
+            values[column] = codes
+        elif kind == 'int':
+            values[column] = np.fromiter((0 if value is None else value for value in raw), dtype=np.int64, count=size)
+        elif kind == 'bool':
+            values[column] = np.fromiter((False if value is None else value for value in raw), dtype=bool, count=size)
+        elif kind == 'float':
+            values[column] = np.fromiter((0.0 if value is None else value for value in raw), dtype=np.float64, count=size)
+        elif kind == 'date':
+            values[column] = np.fromiter((0 if value is None else value.toordinal() for value in raw), dtype=np.int64, count=size)
+        else:
+            objects = np.empty(size, dtype=object)
+            objects[:] = raw
+            values[column] = objects
+        nulls[column] = null
+    return values, nulls
+
+
+def build_bitmaps(data, spec):
+    # Un bitmap empaquetado (np.packbits) por valor distinto de cada columna categórica
+    for column in spec['bitmaps']:
+        present = data.values[column][~data.nulls[column]]
+        distinct = np.unique(present)
+        if len(distinct) > MAX_BITMAP_CARDINALITY:
+            continue
+        column_values = data.values[column]
+        not_null = ~data.nulls[column]
+        data.bitmaps[column] = {
+            value.item(): np.packbits((column_values == value) & not_null)
+            for value in distinct
+        }
+
+
+def sort_data(data, spec):
+    keys = []
+    for column in reversed(spec['order']):
+        keys.append(np.where(data.nulls[column], NULL_SORT_KEY, data.values[column]))
+    order = np.lexsort(keys)
+    for column in data.values:
+        data.values[column] = data.values[column][order]
+        data.nulls[column] = data.nulls[column][order]
+
+
+class ColumnarSnapshot:
+    def __init__(self, name, connect, refresh_interval=30, full_refresh_interval=3600, generation=None):
+        self.name = name
+        self.spec = SPECS[name]
+        self.kinds = dict(self.spec['columns'])
+        self.connect = connect
+        self.refresh_interval = refresh_interval
+        self.full_refresh_interval = full_refresh_interval
+        # Función que devuelve un contador compartido; si cambia desde la última carga completa se recarga todo
+        self.generation = generation
+        self._loaded_generation = None
+        self.data = None
+        self.since = None
+        self._last_full = 0
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        # Después de un fork el hilo del proceso padre ya no existe en el hijo y hay que iniciar otro
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=f'snapshot-{self.name}', daemon=True)
+                self._thread.start()
+
+    def refresh_soon(self):
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Snapshot error ({self.name}): {e}")
+            self._wake.wait(self.refresh_interval)
+            self._wake.clear()
+
+    def refresh(self):
+        generation = self.generation() if self.generation is not None else None
+        if (
+            self.data is None
+            or generation != self._loaded_generation
+            or time.monotonic() - self._last_full >= self.full_refresh_interval
+        ):
+            self.load_full(generation)
+        else:
+            self.load_delta()
+
+    def _fetch(self, query, params=None):
+        connection = self.connect()
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT LOCALTIMESTAMP - make_interval(secs => %s);", (SNAPSHOT_LAG,))
+            since = cursor.fetchone()[0]
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            keys = None
+            if params is not None:
+                cursor.execute(self.spec['keys'])
+                keys = np.fromiter((row[0] for row in cursor.fetchall()), dtype=np.int64)
+            return since, rows, keys
+        finally:
+            cursor.close()
+            connection.close()
+
+    def _publish(self, data, since):
+        sort_data(data, self.spec)
+        build_bitmaps(data, self.spec)
+        self.data = data
+        self.since = since
+
+    def load_full(self, generation=None):
+        # La generación se toma antes de leer: una carga que termine durante la lectura provoca otra recarga
+        if generation is None and self.generation is not None:
+            generation = self.generation()
+        started = time.perf_counter()
+        since, rows, _ = self._fetch(self.spec['select'] + ';')
+        dictionaries = {column: [] for column, kind in self.spec['columns'] if kind == 'str'}
+        lookups = {column: {} for column in dictionaries}
+        values, nulls = encode_rows(rows, self.spec, dictionaries, lookups)
+        self._publish(SnapshotData(len(rows), values, nulls, dictionaries, lookups), since)
+        self._last_full = time.monotonic()
+        self._loaded_generation = generation
+        print(f"Snapshot {self.name}: {len(rows)} filas cargadas en {time.perf_counter() - started:.2f} s")
+
+    def load_delta(self):
+        since, rows, current_keys = self._fetch(self.spec['select'] + self.spec['changed'] + ';', {'since': self.since})
+        old = self.data
+        key = self.spec['key']
+        key_position = [column for column, _ in self.spec['columns']].index(key)
+        changed_keys = np.fromiter((row[key_position] for row in rows), dtype=np.int64, count=len(rows))
+
+        # Se descartan las filas modificadas (vuelven en el delta) y las que ya no existen en la tabla
+        keep = ~np.isin(old.values[key], changed_keys) & np.isin(old.values[key], current_keys)
+        if not rows and keep.all():
+            self.since = since
+            return
+
+        # Los diccionarios se copian para que la versión publicada siga siendo consistente
+        dictionaries = {column: list(dictionary) for column, dictionary in old.dictionaries.items()}
+        lookups = {column: dict(lookup) for column, lookup in old.lookups.items()}
+        delta_values, delta_nulls = encode_rows(rows, self.spec, dictionaries, lookups)
+        values = {column: np.concatenate([old.values[column][keep], delta_values[column]]) for column in old.values}
+        nulls = {column: np.concatenate([old.nulls[column][keep], delta_nulls[column]]) for column in old.nulls}
+        self._publish(SnapshotData(int(keep.sum()) + len(rows), values, nulls, dictionaries, lookups), since)
+
+    def _match(self, data, column, value):
+        # Devuelve (bitmap empaquetado, None) o (None, máscara booleana) con la semántica de "columna = valor" en SQL
+        kind = self.kinds[column]
+        nulls = data.nulls[column]
+        column_values = data.values[column]
+
+        if kind == 'str':
+            if not isinstance(value, str):
+                raise UnsupportedFilter(column)
+            code = data.lookups[column].get(value)
+            if code is None:
+                return None, np.zeros(data.size, dtype=bool)
+            value = code
+        elif kind == 'date':
+            if not isinstance(value, str) or not ISO_DATE.fullmatch(value):
+                raise UnsupportedFilter(column)
+            try:
+                value = date.fromisoformat(value).toordinal()
+            except ValueError:
+                raise UnsupportedFilter(column)
+        elif kind in ('int', 'float', 'bool'):
+            if isinstance(value, str) or (isinstance(value, int) and abs(value) >= 2 ** 63):
+                raise UnsupportedFilter(column)
+            if isinstance(value, float) and math.isnan(value):
+                # En PostgreSQL 'NaN' = 'NaN' es verdadero
+                return None, np.isnan(column_values) & ~nulls if kind == 'float' else np.zeros(data.size, dtype=bool)
+        else:
+            raise UnsupportedFilter(column)
+
+        bitmaps = data.bitmaps.get(column)
+        if bitmaps is not None:
+            bitmap = bitmaps.get(value)
+            if bitmap is None:
+                return None, np.zeros(data.size, dtype=bool)
+            return bitmap, None
+        return None, (column_values == value) & ~nulls
+
+    def _value(self, data, column, index):
+        if data.nulls[column][index]:
+            return None
+        kind = self.kinds[column]
+        value = data.values[column][index]
+        if kind == 'str':
+            return data.dictionaries[column][value]
+        if kind == 'date':
+            return date.fromordinal(int(value))
+        if kind == 'object':
+            return value
+        return value.item()
+
+    def page(self, filters, columns, page, page_size, total_mode):
+        # Devuelve el mismo sobre que execute_page, o None si la consulta debe resolverse en SQL
+        data = self.data
+        if data is None or any(column not in self.kinds for column in columns):
+            return None
+
+        packed = None
+        mask = None
+        try:
+            for argument, value in filters.items():
+                if value is None:
+                    continue
+                column = self.spec['filters'].get(argument, argument)
+                if column not in self.kinds:
+                    return None
+                bitmap, column_mask = self._match(data, column, value)
+                if bitmap is not None:
+                    packed = bitmap if packed is None else np.bitwise_and(packed, bitmap)
+                else:
+                    mask = column_mask if mask is None else mask & column_mask
+        except UnsupportedFilter:
+            return None
+
+        if packed is not None:
+            bitmap_mask = np.unpackbits(packed, count=data.size).astype(bool)
+            mask = bitmap_mask if mask is None else mask & bitmap_mask
+        matches = np.arange(data.size) if mask is None else np.flatnonzero(mask)
+
+        offset = (page - 1) * page_size
+        selected = matches[offset:offset + page_size + 1]
+        has_more = len(selected) > page_size
+        selected = selected[:page_size]
+
+        return {
+            'data': [{column: self._value(data, column, index) for column in columns} for index in selected],
+            'page': page,
+            'page_size': page_size,
+            'has_more': has_more,
+            'total': int(len(matches)) if total_mode else None
+        }
+
+
+def query_value(value):
+    # Representación en query string que los parsers de main.py convierten de vuelta al mismo valor
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def verify(samples=200, seed=0):
+    # Compara las respuestas de la API con y sin snapshot para combinaciones de filtros tomadas de los datos.
+    # Requiere la base de datos; las pruebas sin base de datos están en tests/test_columnar.py
+    import main
+
+    main.response_cache.ttl = 0
+    client = main.app.test_client()
+    # Los snapshots se cargan una sola vez y sin hilo de refresco, así ambas respuestas ven los mismos datos
+    active = {}
+    main.get_snapshot = active.get
+    namespaces = {'proyecto': 'proyectos', 'propiedad': 'propiedades', 'renta': 'renta'}
+    parsers = {'proyecto': main.proyectos_parser, 'propiedad': main.propiedades_parser, 'renta': main.renta_parser}
+    generator = random.Random(seed)
+    mismatches = 0
+
+    for name, namespace in namespaces.items():
+        snapshot = ColumnarSnapshot(name, main.create_connection)
+        snapshot.load_full()
+        data = snapshot.data
+        arguments = [argument.name for argument in parsers[name].args]
+
+        for _ in range(samples):
+            query = {'page_size': generator.choice([1, 5, 100]), 'page': generator.choice([1, 1, 2, 3]), 'total': 'exact'}
+            if data.size:
+                index = generator.randrange(data.size)
+                for argument in generator.sample(arguments, generator.randint(0, min(3, len(arguments)))):
+                    column = snapshot.spec['filters'].get(argument, argument)
+                    value = snapshot._value(data, column, index)
+                    if value is not None:
+                        query[argument] = query_value(value)
+
+            active.clear()
+            expected = client.get(f'/{namespace}/', query_string=query).get_json()
+            active[name] = snapshot
+            actual = client.get(f'/{namespace}/', query_string=query).get_json()
+            if expected != actual:
+                mismatches += 1
+                print(f"Diferencia en /{namespace}/ con {query}")
+
+        print(f"/{namespace}/: {samples} consultas comparadas")
+
+    print(f"{mismatches} diferencias")
+    return mismatches
+
+
+if __name__ == '__main__':
+    if '--verify' in sys.argv:
+        sys.exit(1 if verify() else 0)
+    print("Uso: python3 columnar.py --verify")
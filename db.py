@@ -0,0 +1,40 @@
+# Conexión a PostgreSQL compartida por la API (main.py) y los scripts (recompute.py)
+# Importar este módulo no carga la aplicación Flask
+
+import os
+import socket
+import psycopg2
+from dotenv import load_dotenv
+from psycopg2 import Error as PGError
+
+load_dotenv()
+
+HOST = os.getenv('DB_HOST')
+PORT = os.getenv('DB_PORT')
+USER = os.getenv('DB_USER')
+DATABASE = os.getenv('DB_NAME')
+PASSWORD = os.getenv('DB_PASSWORD')
+
+if not all([HOST, PORT, USER, DATABASE, PASSWORD]):
+    raise ValueError("Missing one or more required environment variables for database connection.")
+
+
+def create_connection():
+    try:
+        ipv4_address = socket.gethostbyname(HOST)
+        connection = psycopg2.connect(
+            user=USER,
+            password=PASSWORD,
+            host=ipv4_address,
+            port=PORT,
+            dbname=DATABASE,
+            sslmode='require'
+        )
+        print("Connected to the database")
+        return connection
+    except socket.gaierror as e:
+        print(f"Error resolving the host: {e}")
+        raise
+    except PGError as e:
+        print(f"Error connecting to the database: {e}")
+        raise
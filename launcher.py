@@ -0,0 +1,294 @@
+# servidor de producción = python3 launcher.py [--workers N] [--bind 0.0.0.0:8000]
+# recargar código sin cortar conexiones = kill -HUP <pid del maestro>
+# medir el arranque = python3 launcher.py --benchmark
+# límite del cuerpo de las peticiones (cargas masivas) = BULK_MAX_BODY_SIZE=<bytes> o --max-body-size <bytes>
+#
+# El maestro importa main.py una sola vez, calienta las cachés y hace fork de los workers: cada hijo
+# comparte la aplicación ya construida y la caché de respuestas en memoria compartida (shared_cache.py)
+
+import os
+import sys
+import time
+import select
+import signal
+import socket
+import asyncio
+import argparse
+import subprocess
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from shared_cache import SharedResponseCache
+
+# Catálogos pequeños que consultan todas las páginas del frontend
+WARM_PATHS = ('/sociedades/', '/estatus_legal/', '/ubicacion/')
+SCRIPT = os.path.abspath(sys.argv[0])
+
+main = None
+
+
+def log(message):
+    print(f"[launcher {os.getpid()}] {message}", flush=True)
+
+
+def load_app(args):
+    global main
+    import main as app_module
+    main = app_module
+    main.response_cache = SharedResponseCache(
+        main.CACHE_TTL,
+        slots=args.cache_slots,
+        slot_size=args.cache_slot_size,
+        local=main.ResponseCache(main.CACHE_TTL, main.CACHE_MAX_ENTRIES)
+    )
+
+
+def warm_caches():
+    client = main.app.test_client()
+    encodings = [None] + list(main.COMPRESSORS)
+    for path in WARM_PATHS:
+        for encoding in encodings:
+            response = client.get(path, headers={'Accept-Encoding': encoding} if encoding else {})
+            if response.status_code != 200:
+                log(f"No se pudo precalentar {path}: {response.status_code}")
+                break
+
+    if main.SNAPSHOT_MODE and main.columnar is not None:
+        for table in main.columnar.SPECS:
+            snapshot = main.create_snapshot(table)
+            snapshot.load_full()
+            main.snapshots[table] = snapshot
+
+    # Las conexiones del maestro no pueden heredarse: cada worker abre su propio pool
+    if main.connection_pool is not None:
+        main.connection_pool.closeall()
+        main.connection_pool = None
+
+
+def create_listener(bind):
+    inherited = os.environ.pop('LAUNCHER_FD', None)
+    if inherited:
+        listener = socket.socket(fileno=int(inherited))
+    else:
+        host, port = bind.rsplit(':', 1)
+        host = host.strip('[]')
+        listener = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((host, int(port)))
+        listener.listen(2048)
+    listener.set_inheritable(True)
+    return listener
+
+
+def run_worker(listener, ready_fd, graceful_timeout, max_body_size):
+    from hypercorn.config import Config
+    from hypercorn.asyncio import serve
+
+    # La recarga la maneja el maestro; SIGTERM/SIGINT los atiende el loop de asyncio
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    try:
+        main.get_connection_pool()
+    except Exception as e:
+        log(f"No se pudo abrir el pool de conexiones, se reintentará en la primera consulta: {e}")
+
+    config = Config()
+    config.bind = [f"fd://{listener.fileno()}"]
+    config.graceful_timeout = graceful_timeout
+    # hypercorn guarda el cuerpo completo en memoria y responde 400 sin mensaje a lo que exceda este límite;
+    # /carga es el único endpoint con cuerpos grandes
+    config.wsgi_max_body_size = max_body_size
+
+    async def serve_until_signal():
+        shutdown = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        # Los cupos de QUERY_LIMITS se calculan sobre este número de hilos
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=main.WORKER_THREADS, thread_name_prefix='wsgi'))
+        loop.add_signal_handler(signal.SIGTERM, shutdown.set)
+        loop.add_signal_handler(signal.SIGINT, shutdown.set)
+        os.write(ready_fd, b'1')
+        os.close(ready_fd)
+        await serve(main.app, config, shutdown_trigger=shutdown.wait, mode='wsgi')
+
+    asyncio.run(serve_until_signal())
+
+
+class Master:
+    def __init__(self, args, listener):
+        self.args = args
+        self.listener = listener
+        self.workers = set()
+        self.old_workers = {int(pid) for pid in os.environ.pop('LAUNCHER_OLD_WORKERS', '').split(',') if pid}
+        self.stopping = False
+        self.reloading = False
+
+    def spawn(self, count, timeout=60):
+        # Devuelve cuando todos los workers nuevos abrieron su pool y están listos para recibir tráfico
+        read_fd, write_fd = os.pipe()
+        sys.stdout.flush()
+        for _ in range(count):
+            pid = os.fork()
+            if pid == 0:
+                os.close(read_fd)
+                code = 0
+                try:
+                    run_worker(self.listener, write_fd, self.args.graceful_timeout, self.args.max_body_size)
+                except Exception as e:
+                    log(f"Worker terminó con error: {e}")
+                    code = 1
+                finally:
+                    sys.stdout.flush()
+                    os._exit(code)
+            self.workers.add(pid)
+        os.close(write_fd)
+
+        ready = 0
+        deadline = time.monotonic() + timeout
+        while ready < count and time.monotonic() < deadline:
+            readable, _, _ = select.select([read_fd], [], [], max(deadline - time.monotonic(), 0))
+            if not readable:
+                break
+            chunk = os.read(read_fd, count)
+            if not chunk:
+                break
+            ready += len(chunk)
+        os.close(read_fd)
+        return ready
+
+    def handle_signal(self, signum, frame):
+        if signum == signal.SIGHUP:
+            self.reloading = True
+        else:
+            self.stopping = True
+
+    def install_signal_handlers(self):
+        signal.signal(signal.SIGHUP, self.handle_signal)
+        signal.signal(signal.SIGTERM, self.handle_signal)
+        signal.signal(signal.SIGINT, self.handle_signal)
+
+    def retire_old_workers(self):
+        for pid in self.old_workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            self.old_workers.discard(pid)
+            if pid in self.workers:
+                self.workers.discard(pid)
+                if not self.stopping:
+                    log(f"Worker {pid} terminó (estado {status}), se reemplaza")
+                    self.spawn(1)
+
+    def reload(self):
+        # Se valida el código nuevo antes de reemplazar al maestro: si no importa, se sigue con la versión actual
+        self.reloading = False
+        check = subprocess.run([sys.executable, '-c', 'import main'], cwd=os.path.dirname(SCRIPT))
+        if check.returncode != 0:
+            log("Recarga cancelada: main.py no se pudo importar")
+            return
+
+        # exec conserva el PID, así que los workers actuales siguen siendo hijos del maestro nuevo,
+        # que los retira con SIGTERM cuando sus propios workers están listos
+        log("Recargando")
+        os.environ['LAUNCHER_FD'] = str(self.listener.fileno())
+        os.environ['LAUNCHER_OLD_WORKERS'] = ','.join(str(pid) for pid in self.workers | self.old_workers)
+        sys.stdout.flush()
+        os.execv(sys.executable, [sys.executable, SCRIPT] + sys.argv[1:])
+
+    def shutdown(self):
+        self.stopping = True
+        for pid in self.workers | self.old_workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.args.graceful_timeout + 5
+        while (self.workers or self.old_workers) and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in self.workers | self.old_workers:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        self.install_signal_handlers()
+        while not self.stopping:
+            if self.reloading:
+                self.reload()
+            self.reap()
+            time.sleep(0.5)
+        log("Deteniendo workers")
+        self.shutdown()
+
+
+def benchmark(args, timings, master):
+    host, port = args.bind.rsplit(':', 1)
+    host = host.strip('[]')
+    if host in ('0.0.0.0', '::', ''):
+        host = '127.0.0.1'
+    started = time.perf_counter()
+    with urllib.request.urlopen(f"http://{host}:{port}/swagger.json", timeout=30) as response:
+        response.read()
+    timings.append(('primera respuesta', time.perf_counter() - started))
+
+    total = sum(seconds for _, seconds in timings)
+    for name, seconds in timings:
+        print(f"{name:<24}{seconds * 1000:>10.1f} ms")
+    print(f"{'total':<24}{total * 1000:>10.1f} ms")
+    master.shutdown()
+
+
+def run():
+    parser = argparse.ArgumentParser(description='Servidor de producción con workers prefork para la API de Banco de Tierras')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Número de workers (por defecto, uno por CPU)')
+    parser.add_argument('--bind', default=os.getenv('BIND', '0.0.0.0:8000'), help='Dirección host:puerto')
+    parser.add_argument('--graceful-timeout', type=float, default=30, help='Segundos para terminar peticiones en curso al detener o recargar')
+    parser.add_argument('--max-body-size', type=int, help='Bytes máximos del cuerpo de una petición (por defecto BULK_MAX_BODY_SIZE de main.py)')
+    parser.add_argument('--cache-slots', type=int, default=1024, help='Entradas de la caché compartida')
+    parser.add_argument('--cache-slot-size', type=int, default=64 * 1024, help='Bytes máximos por entrada de la caché compartida')
+    parser.add_argument('--benchmark', action='store_true', help='Mide cada fase del arranque, responde una petición y termina')
+    args = parser.parse_args()
+
+    timings = []
+    started = time.perf_counter()
+    load_app(args)
+    timings.append(('import main', time.perf_counter() - started))
+    if args.max_body_size is None:
+        args.max_body_size = main.BULK_MAX_BODY_SIZE
+    elif args.max_body_size > main.BULK_MAX_BODY_SIZE:
+        log(f"--max-body-size es mayor que BULK_MAX_BODY_SIZE ({main.BULK_MAX_BODY_SIZE}): /carga rechazará los cuerpos más grandes con 413")
+
+    started = time.perf_counter()
+    warm_caches()
+    timings.append(('precalentar cachés', time.perf_counter() - started))
+
+    listener = create_listener(args.bind)
+    master = Master(args, listener)
+
+    started = time.perf_counter()
+    ready = master.spawn(args.workers)
+    timings.append((f'{ready}/{args.workers} workers listos', time.perf_counter() - started))
+    log(f"{ready}/{args.workers} workers escuchando en {args.bind}")
+    master.retire_old_workers()
+
+    if args.benchmark:
+        benchmark(args, timings, master)
+        return
+    master.run()
+
+
+if __name__ == '__main__':
+    run()
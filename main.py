@@ -1,53 +1,309 @@
 # create virutal enviroment = python3 -m venv venv
 # open virtual environment = source venv/bin/activate
 # install dependencies = pip install -r requirements.txt
-# turn on the api = python3/hypercorn main.py
+# optional compression (brotli/zstd) = pip install brotli zstandard
+# numpy for the columnar snapshot (SNAPSHOT_MODE=1) and recompute.py = pip install numpy
+# turn on the api (development) = python3 main.py
+# turn on the api (production) = python3 launcher.py --workers N
+# run the tests = pip install pytest && python3 -m pytest tests
 
+import io
 import os
+import csv
+import gzip
+import hmac
+import json
+import math
+import time
+import zlib
 import socket
+import threading
 import psycopg2
+from datetime import date
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from flask_cors import CORS
-from dotenv import load_dotenv
 from psycopg2 import Error as PGError
 from psycopg2.extras import DictCursor
-from flask import Flask, jsonify, request
-from psycopg2.errors import UndefinedTable
-from flask_restx import Api, Namespace, Resource, reqparse
-
-load_dotenv()
-
-HOST = os.getenv('DB_HOST')
-PORT = os.getenv('DB_PORT')
-USER = os.getenv('DB_USER')
-DATABASE = os.getenv('DB_NAME')
-PASSWORD = os.getenv('DB_PASSWORD')
-
-if not all([HOST, PORT, USER, DATABASE, PASSWORD]):
-    raise ValueError("Missing one or more required environment variables for database connection.")
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+from flask import Flask, g, jsonify, request
+from psycopg2.errors import QueryCanceled, UndefinedColumn, UndefinedTable
+from werkzeug.exceptions import ServiceUnavailable, TooManyRequests
+from flask_restx import Api, Namespace, Resource, abort, fields, inputs, reqparse
+# db carga el .env y valida la configuración de la base de datos antes de leer el resto de variables
+from db import HOST, PORT, USER, DATABASE, PASSWORD, create_connection
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import columnar
+except ImportError:
+    columnar = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_LEVEL = int(os.getenv('COMPRESSION_LEVEL', 6))
+# Segundos que se sirve una página de la caché de respuestas (60 por defecto). Solo /carga limpia la caché:
+# los cambios hechos por fuera de la API (recompute.py, scripts, SQL directo) se ven hasta que vence la entrada.
+# CACHE_TTL=0 desactiva la caché
+CACHE_TTL = float(os.getenv('CACHE_TTL', 60))
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 256))
+STATEMENT_TIMEOUT_MS = int(os.getenv('STATEMENT_TIMEOUT_MS', 5000))
+QUEUE_TIMEOUT = float(os.getenv('QUEUE_TIMEOUT', 2))
+BULK_LOAD_TOKEN = os.getenv('BULK_LOAD_TOKEN')
+# Tamaño máximo del cuerpo de /carga (ya comprimido si llega con Content-Encoding: gzip). hypercorn guarda el cuerpo
+# completo en memoria antes de llamar a la aplicación, así que launcher.py lo usa como wsgi_max_body_size
+BULK_MAX_BODY_SIZE = int(os.getenv('BULK_MAX_BODY_SIZE', 256 * 1024 * 1024))
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', 1))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', 32))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 2))
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', 10))
+BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', 4))
+SNAPSHOT_MODE = os.getenv('SNAPSHOT_MODE', '0') == '1'
+SNAPSHOT_REFRESH = float(os.getenv('SNAPSHOT_REFRESH', 30))
+SNAPSHOT_FULL_REFRESH = float(os.getenv('SNAPSHOT_FULL_REFRESH', 3600))
+GEO_BACKEND = os.getenv('GEO_BACKEND', 'plain')  # 'plain' (índice B-tree en latitud/longitud) o 'postgis' (índice GiST)
+GEO_DEFAULT_RADIUS_KM = float(os.getenv('GEO_DEFAULT_RADIUS_KM', 50))
+
+# Hilos con los que el servidor atiende peticiones WSGI en cada worker (mismo valor por defecto que el
+# executor de asyncio que usa hypercorn); launcher.py configura el executor con este número
+WORKER_THREADS = int(os.getenv('WORKER_THREADS', min(32, (os.cpu_count() or 1) + 4)))
+HEAVY_QUERY_SLOTS = max(1, WORKER_THREADS // 4)
+
+# Límites por tabla consultada: cada una tiene su propio cupo para que una consulta pesada
+# (ej. proyectos con todos sus JOIN) no deje sin hilos ni conexiones a los catálogos pequeños.
+# La espera en la cola ocupa un hilo del servidor, así que las tablas pesadas no encolan (max_queued = 0):
+# entre todas usan como máximo 3/4 de WORKER_THREADS más la carga masiva y siempre quedan hilos libres
+QUERY_LIMITS = {
+    'proyecto': {'statement_timeout_ms': 15000, 'max_concurrent': HEAVY_QUERY_SLOTS, 'max_queued': 0},
+    'propiedad': {'statement_timeout_ms': 10000, 'max_concurrent': HEAVY_QUERY_SLOTS, 'max_queued': 0},
+    'renta': {'statement_timeout_ms': 10000, 'max_concurrent': HEAVY_QUERY_SLOTS, 'max_queued': 0},
+    'carga': {'statement_timeout_ms': 300000, 'max_concurrent': 1, 'max_queued': 0},
+}
+DEFAULT_QUERY_LIMITS = {'statement_timeout_ms': STATEMENT_TIMEOUT_MS, 'max_concurrent': 16, 'max_queued': 32}
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})
 api = Api(app, version='1.0', title='Banco de Tierras', description='API para obtener todos los datos de la base de datos de Banco de Tierras')
 
-def create_connection():
+class BlockingConnectionPool(ThreadedConnectionPool):
+    # ThreadedConnectionPool cierra al devolverla cualquier conexión por encima de minconn y falla de inmediato
+    # cuando se agota. Este pool abre minconn al inicio, crece bajo demanda hasta maxconn, conserva abiertas
+    # todas las conexiones que abrió y hace esperar hasta timeout segundos cuando todas están en uso
+    def __init__(self, minconn, maxconn, timeout, *args, **kwargs):
+        super().__init__(minconn, maxconn, *args, **kwargs)
+        self.minconn = self.maxconn  # _putconn solo cierra conexiones cuando hay minconn libres
+        self.timeout = timeout
+        self._available = threading.Condition(self._lock)
+
+    def getconn(self, key=None):
+        deadline = time.monotonic() + self.timeout
+        with self._available:
+            while not self.closed and not self._pool and len(self._used) >= self.maxconn:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolError("connection pool exhausted")
+                self._available.wait(remaining)
+            return self._getconn(key)
+
+    def putconn(self, conn=None, key=None, close=False):
+        with self._available:
+            self._putconn(conn, key, close)
+            self._available.notify()
+
+
+connection_pool = None
+connection_pool_pid = None
+connection_pool_lock = threading.Lock()
+
+
+def get_connection_pool():
+    # Un pool por proceso: las conexiones no se pueden compartir entre procesos después de un fork
+    global connection_pool, connection_pool_pid
+    with connection_pool_lock:
+        if connection_pool is None or connection_pool_pid != os.getpid():
+            try:
+                connection_pool = BlockingConnectionPool(
+                    DB_POOL_MIN,
+                    DB_POOL_MAX,
+                    DB_POOL_TIMEOUT,
+                    user=USER,
+                    password=PASSWORD,
+                    host=socket.gethostbyname(HOST),
+                    port=PORT,
+                    dbname=DATABASE,
+                    sslmode='require'
+                )
+            except socket.gaierror as e:
+                print(f"Error resolving the host: {e}")
+                raise
+            except PGError as e:
+                print(f"Error connecting to the database: {e}")
+                raise
+            connection_pool_pid = os.getpid()
+            print("Connection pool ready")
+        return connection_pool
+
+
+@contextmanager
+def pooled_connection():
+    pool = get_connection_pool()
     try:
-        ipv4_address = socket.gethostbyname(HOST)
-        connection = psycopg2.connect(
-            user=USER,
-            password=PASSWORD,
-            host=ipv4_address,
-            port=PORT,
-            dbname=DATABASE,
-            sslmode='require'
-        )
-        print("Connected to the database")
-        return connection
-    except socket.gaierror as e:
-        print(f"Error resolving the host: {e}")
-        raise
-    except PGError as e:
-        print(f"Error connecting to the database: {e}")
-        raise
+        connection = pool.getconn()
+    except PoolError:
+        raise ServiceUnavailable('No hay conexiones disponibles a la base de datos, intenta de nuevo más tarde', retry_after=1)
+    try:
+        yield connection
+    finally:
+        # putconn hace rollback de la transacción abierta antes de devolver la conexión al pool
+        pool.putconn(connection, close=bool(connection.closed))
+
+# Orden de preferencia del servidor cuando el cliente acepta varias codificaciones con la misma calidad
+COMPRESSORS = OrderedDict()
+if zstandard is not None:
+    COMPRESSORS['zstd'] = lambda data: zstandard.ZstdCompressor(level=min(max(COMPRESSION_LEVEL, 1), 22)).compress(data)
+if brotli is not None:
+    COMPRESSORS['br'] = lambda data: brotli.compress(data, quality=min(max(COMPRESSION_LEVEL, 0), 11))
+COMPRESSORS['gzip'] = lambda data: gzip.compress(data, compresslevel=min(max(COMPRESSION_LEVEL, 1), 9))
+
+
+class ResponseCache:
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Cambia con cada clear(); los snapshots columnar lo usan para saber que hubo una carga masiva
+        self.generation = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+
+
+response_cache = ResponseCache(CACHE_TTL, CACHE_MAX_ENTRIES)
+
+
+class AdmissionGate:
+    def __init__(self, max_concurrent, max_queued):
+        self.max_queued = max_queued
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._waiting = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def admit(self, timeout):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                if self._waiting >= self.max_queued:
+                    raise TooManyRequests('Demasiadas consultas en espera, intenta de nuevo más tarde', retry_after=1)
+                self._waiting += 1
+            try:
+                acquired = self._slots.acquire(timeout=timeout)
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+            if not acquired:
+                raise ServiceUnavailable('El servidor está ocupado, intenta de nuevo más tarde', retry_after=int(timeout) + 1)
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+
+admission_gates = {}
+admission_gates_lock = threading.Lock()
+
+
+def get_query_limits(table):
+    return QUERY_LIMITS.get(table, DEFAULT_QUERY_LIMITS)
+
+
+def get_admission_gate(table):
+    with admission_gates_lock:
+        gate = admission_gates.get(table)
+        if gate is None:
+            limits = get_query_limits(table)
+            gate = admission_gates[table] = AdmissionGate(limits['max_concurrent'], limits['max_queued'])
+        return gate
+
+
+def negotiate_encoding():
+    return request.accept_encodings.best_match(list(COMPRESSORS))
+
+
+@app.before_request
+def serve_cached_response():
+    if request.method != 'GET':
+        return None
+
+    g.encoding = negotiate_encoding()
+    cached = response_cache.get((request.full_path, g.encoding))
+    if cached is None:
+        return None
+
+    # La entrada ya está comprimida: se devuelve tal cual sin volver a comprimir
+    body, mimetype, content_encoding = cached
+    response = app.response_class(body, mimetype=mimetype)
+    if content_encoding:
+        response.headers['Content-Encoding'] = content_encoding
+    response.headers['X-Cache'] = 'HIT'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+@app.after_request
+def compress_response(response):
+    if response.headers.get('X-Cache') == 'HIT':
+        return response
+    if response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = g.get('encoding', negotiate_encoding())
+    body = response.get_data()
+    content_encoding = None
+    if encoding and len(body) >= COMPRESSION_MIN_SIZE:
+        body = COMPRESSORS[encoding](body)
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        content_encoding = encoding
+
+    # Solo se guardan las consultas exitosas (execute_page marca g.cacheable)
+    if request.method == 'GET' and response.status_code == 200 and g.get('cacheable'):
+        response_cache.set((request.full_path, encoding), (body, response.mimetype, content_encoding))
+    return response
+
 
 @app.route('/test-db', methods=['GET'])
 def test_db():
@@ -58,30 +314,232 @@ def test_db():
         return {"message": f"Connection failed: {str(e)}"}, 500
 
 
-def execute_query(query, columns, params=None):
-    params = params or ()  # Evita problemas si params es None
-    connection = create_connection()
-    cursor = connection.cursor(cursor_factory=DictCursor)
-    try:
-        cursor.execute(query, params)
-        result = cursor.fetchall()
-        if result:
-            return [dict(zip(columns, row)) for row in result]
-        else:
-            return []  # O manejarlo como desees si no hay resultados
-    except psycopg2.Error as e:
-        print(f"Database error: {e}")
-        raise
-    except Exception as e:
-        print(f"Unexpected error: {e}")
-        raise
-    finally:
-        cursor.close()
-        connection.close()  # O usa el connection pool si decides implementarlo
+snapshots = {}
+snapshots_lock = threading.Lock()
+
+
+def data_generation():
+    # launcher.py reemplaza response_cache por la caché compartida, así que se consulta en cada llamada
+    return response_cache.generation
+
+
+def create_snapshot(table):
+    return columnar.ColumnarSnapshot(table, create_connection, SNAPSHOT_REFRESH, SNAPSHOT_FULL_REFRESH, generation=data_generation)
+
+
+def get_snapshot(table):
+    # El snapshot se crea en el primer uso de cada proceso; mientras carga, las consultas van a SQL
+    if not SNAPSHOT_MODE or columnar is None or table not in columnar.SPECS:
+        return None
+    with snapshots_lock:
+        snapshot = snapshots.get(table)
+        if snapshot is None:
+            snapshot = snapshots[table] = create_snapshot(table)
+    # Los snapshots precargados por launcher.py llegan sin hilo de refresco a cada worker
+    snapshot.start()
+    return snapshot
+
+
+def has_filters(another_args):
+    return any(value is not None for value in another_args.values())
+
+
+def select_fields(fields, columns, optional_columns=()):
+    # Solo se aceptan columnas conocidas: la lista resultante se inserta directamente en el SELECT.
+    # Las columnas opcionales no van en la proyección por defecto, solo cuando se piden en fields
+    if not fields:
+        return columns
+
+    available = list(columns) + [column for column in optional_columns if column not in columns]
+    selected = []
+    for field in fields.split(','):
+        field = field.strip()
+        if not field:
+            continue
+        if field not in available:
+            abort(400, f"Campo desconocido: {field}. Campos disponibles: {', '.join(available)}")
+        if field not in selected:
+            selected.append(field)
+    return selected or columns
+
+
+def estimate_total(cursor, query, params, table, filtered, joined=False):
+    # Sin filtros basta la estadística del catálogo; con filtros, o si la consulta pagina sobre filas de un JOIN
+    # (una por combinación, no una por registro de la tabla), se usa la estimación del planificador
+    if not filtered and not joined:
+        cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass;", (table,))
+        row = cursor.fetchone()
+        if row and row[0] >= 0:  # reltuples es -1 si la tabla nunca ha sido analizada
+            return row[0]
+
+    cursor.execute("EXPLAIN (FORMAT JSON) " + query, params)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def execute_page(query, columns, params, args, table, filtered=False, prefix='', geo=None, filters=None, optional_columns=(), joined=False):
+    page = args.get('page')
+    page_size = args.get('page_size')
+    total_mode = args.get('total')
+
+    if page < 1 or page_size < 1:
+        abort(400, 'page y page_size deben ser mayores a 0')
+
+    offset = (page - 1) * page_size
+    # Con una consulta geográfica las coordenadas se devuelven aunque no se pidan en fields
+    default_columns = list(columns) + list(optional_columns) if geo is not None else columns
+    columns = select_fields(args.get('fields'), default_columns, optional_columns)
+
+    snapshot = get_snapshot(table) if filters is not None and geo is None else None
+    if snapshot is not None:
+        result = snapshot.page(filters, columns, page, page_size, total_mode)
+        if result is not None:
+            g.cacheable = True
+            return result
+
+    geo_filter, geo_params, geo_order, geo_order_params = geo or ('TRUE', (), '', ())
+    params = tuple(params) + tuple(geo_params) + tuple(geo_order_params)
+
+    select = ', '.join(prefix + column for column in columns)
+    base_query = query.format(select=select, geo_filter=geo_filter, geo_order=geo_order)
+    if total_mode == 'exact':
+        select += ', count(*) OVER() AS total_count'
+    # Se pide un registro extra para saber si existe una página siguiente sin contar toda la tabla
+    page_query = query.format(select=select, geo_filter=geo_filter, geo_order=geo_order) + "LIMIT %s OFFSET %s;"
+
+    limits = get_query_limits(table)
+    statement_timeout_ms = limits['statement_timeout_ms']
+    with get_admission_gate(table).admit(QUEUE_TIMEOUT), pooled_connection() as connection:
+        cursor = connection.cursor(cursor_factory=DictCursor)
+        try:
+            # PostgreSQL cancela la consulta del lado del servidor al vencer el plazo, aunque el cliente ya se haya ido
+            cursor.execute("SET statement_timeout = %s;", (statement_timeout_ms,))
+            cursor.execute(page_query, params + (page_size + 1, offset))
+            rows = cursor.fetchall()
+            has_more = len(rows) > page_size
+            rows = rows[:page_size]
+
+            total = None
+            if total_mode == 'exact':
+                if rows:
+                    total = rows[0]['total_count']
+                elif offset == 0:
+                    total = 0
+                else:
+                    # Página fuera de rango: la ventana no devuelve filas, se cuenta por separado
+                    cursor.execute(f"SELECT count(*) FROM ({base_query}) AS page_base;", params)
+                    total = cursor.fetchone()[0]
+            elif total_mode == 'estimated':
+                total = estimate_total(cursor, base_query, params, table, filtered, joined)
+
+            g.cacheable = True
+            return {
+                'data': [dict(zip(columns, row)) for row in rows],
+                'page': page,
+                'page_size': page_size,
+                'has_more': has_more,
+                'total': total
+            }
+        except QueryCanceled as e:
+            print(f"Query canceled: {e}")
+            raise ServiceUnavailable(f'La consulta excedió el tiempo límite de {statement_timeout_ms} ms, agrega filtros o reduce page_size')
+        except UndefinedColumn as e:
+            if geo is None and not set(optional_columns) & set(columns):
+                print(f"Database error: {e}")
+                raise
+            print(f"Missing geo columns: {e}")
+            abort(501, f"{table} no tiene las columnas latitud/longitud: ejecuta el ALTER TABLE documentado en main.py para habilitar las consultas geográficas")
+        except psycopg2.Error as e:
+            print(f"Database error: {e}")
+            raise
+        except Exception as e:
+            print(f"Unexpected error: {e}")
+            raise
+        finally:
+            cursor.close()
 
 generic_parser = reqparse.RequestParser()
 generic_parser.add_argument('page', type=int, help='Opcional: Número de página', default=1)
 generic_parser.add_argument('page_size', type=int, help='Opcional: Cantidad de registros por página', default=100)
+generic_parser.add_argument('fields', type=str, help='Opcional: Columnas a devolver separadas por coma (ej. id,clave,nombre)')
+generic_parser.add_argument('total', type=str, choices=('exact', 'estimated'), help='Opcional: Incluir el total de registros (exact = conteo exacto, estimated = estimación de PostgreSQL)')
+
+# Columnas agregadas con ALTER TABLE: solo se consultan en los modos geográficos o si se piden en fields
+GEO_COLUMNS = ('latitud', 'longitud')
+# Mismas expresiones que los índices GiST documentados en ubicacion y propiedad (GEO_BACKEND=postgis):
+# la geometría plana sirve a la caja (igual que latitud/longitud BETWEEN) y la geografía al radio y a los cercanos
+GEO_GEOMETRY = "ST_SetSRID(ST_MakePoint(longitud, latitud), 4326)"
+GEO_POINT = f"{GEO_GEOMETRY}::geography"
+
+geo_parser = reqparse.RequestParser()
+geo_parser.add_argument('bbox', type=str, help='Opcional: Caja delimitadora min_lon,min_lat,max_lon,max_lat')
+geo_parser.add_argument('lat', type=float, help='Opcional: Latitud del punto de referencia (ordena por cercanía)')
+geo_parser.add_argument('lon', type=float, help='Opcional: Longitud del punto de referencia (ordena por cercanía)')
+geo_parser.add_argument('radio_km', type=float, help=f'Opcional: Radio de búsqueda en km alrededor de lat/lon (por defecto {GEO_DEFAULT_RADIUS_KM:g})')
+
+
+def build_geo_filter(geo_args):
+    # Devuelve (condición, parámetros, orden, parámetros del orden) para los modos bbox, radio y cercanos.
+    # En modo plain la caja usa el índice (latitud, longitud) y el radio se acota con esa misma caja antes de medir
+    # la distancia; en modo postgis la caja usa el índice GiST de GEO_GEOMETRY y el radio el de GEO_POINT.
+    conditions = []
+    condition_params = []
+    order = ''
+    order_params = ()
+
+    bbox = geo_args.get('bbox')
+    if bbox:
+        try:
+            min_lon, min_lat, max_lon, max_lat = (float(value) for value in bbox.split(','))
+        except ValueError:
+            abort(400, 'bbox debe tener el formato min_lon,min_lat,max_lon,max_lat')
+        if GEO_BACKEND == 'postgis':
+            # && compara cajas del índice (redondeadas a float4); el BETWEEN deja el resultado exacto e igual al modo plain
+            conditions.append(
+                f"{GEO_GEOMETRY} && ST_MakeEnvelope(%s, %s, %s, %s, 4326)"
+                " AND latitud BETWEEN %s AND %s AND longitud BETWEEN %s AND %s"
+            )
+            condition_params += [min_lon, min_lat, max_lon, max_lat, min_lat, max_lat, min_lon, max_lon]
+        else:
+            conditions.append("latitud BETWEEN %s AND %s AND longitud BETWEEN %s AND %s")
+            condition_params += [min_lat, max_lat, min_lon, max_lon]
+
+    lat = geo_args.get('lat')
+    lon = geo_args.get('lon')
+    radio_km = geo_args.get('radio_km')
+    if (lat is None) != (lon is None):
+        abort(400, 'lat y lon deben enviarse juntos')
+    if lat is None and radio_km is not None:
+        abort(400, 'radio_km requiere lat y lon')
+
+    if lat is not None:
+        radio_km = GEO_DEFAULT_RADIUS_KM if radio_km is None else radio_km
+        if radio_km <= 0:
+            abort(400, 'radio_km debe ser mayor a 0')
+
+        if GEO_BACKEND == 'postgis':
+            reference = "ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography"
+            conditions.append(f"ST_DWithin({GEO_POINT}, {reference}, %s)")
+            condition_params += [lon, lat, radio_km * 1000]
+            order = f"{GEO_POINT} <-> {reference}, "
+            order_params = (lon, lat)
+        else:
+            delta_lat = radio_km / 111.32
+            delta_lon = radio_km / (111.32 * max(math.cos(math.radians(lat)), 0.01))
+            distance = (
+                "6371 * 2 * asin(sqrt(power(sin(radians(latitud - %s) / 2), 2)"
+                " + cos(radians(%s)) * cos(radians(latitud)) * power(sin(radians(longitud - %s) / 2), 2)))"
+            )
+            conditions.append(f"latitud BETWEEN %s AND %s AND longitud BETWEEN %s AND %s AND {distance} <= %s")
+            condition_params += [lat - delta_lat, lat + delta_lat, lon - delta_lon, lon + delta_lon, lat, lat, lon, radio_km]
+            order = f"{distance}, "
+            order_params = (lat, lat, lon)
+
+    if not conditions:
+        return None
+    return ' AND '.join(conditions), tuple(condition_params), order, order_params
 
 
 # CREATE TABLE sociedad (
@@ -103,10 +561,6 @@ class Sociedades(Resource):
 
         porcentaje_participacion = another_args.get('porcentaje_participacion')
 
-        page = args.get('page')
-        page_size = args.get('page_size')
-        offset = (page - 1) * page_size
-
         columns = [
             'id',
             'porcentaje_participacion',
@@ -115,21 +569,17 @@ class Sociedades(Resource):
         ]
 
         query = """
-            SELECT
-                id,
-                porcentaje_participacion,
-                created_at,
-                updated_at
+            SELECT {select}
             FROM sociedad
             WHERE
                 (%s IS NULL OR porcentaje_participacion = %s)
-            LIMIT %s OFFSET %s;
+            ORDER BY id
         """
 
-        params = (porcentaje_participacion, porcentaje_participacion, page_size, offset)
+        params = (porcentaje_participacion, porcentaje_participacion)
 
         try:
-            result = execute_query(query, columns, params)
+            result = execute_page(query, columns, params, args, 'sociedad', has_filters(another_args))
             return jsonify(result)
         except PGError as e:
             return jsonify({'message': str(e)})
@@ -153,10 +603,6 @@ class EstatusLegal(Resource):
 
         nombre = another_args.get('nombre')
 
-        page = args.get('page')
-        page_size = args.get('page_size')
-        offset = (page - 1) * page_size
-
         columns = [
             'id',
             'nombre',
@@ -165,21 +611,17 @@ class EstatusLegal(Resource):
         ]
 
         query = """
-            SELECT
-                id,
-                nombre,
-                created_at,
-                updated_at
+            SELECT {select}
             FROM estatus_legal
             WHERE
                 (%s IS NULL OR nombre = %s)
-            LIMIT %s OFFSET %s;
+            ORDER BY id
         """
 
-        params = (nombre, nombre, page_size, offset)
+        params = (nombre, nombre)
 
         try:
-            result = execute_query(query, columns, params)
+            result = execute_page(query, columns, params, args, 'estatus_legal', has_filters(another_args))
             return jsonify(result)
         except PGError as e:
             return jsonify({'message': str(e)})
@@ -187,26 +629,30 @@ class EstatusLegal(Resource):
 # CREATE TABLE ubicacion (
 #     id SERIAL PRIMARY KEY,
 #     nombre VARCHAR(255) NOT NULL UNIQUE,
+#     latitud FLOAT,
+#     longitud FLOAT,
 #     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
 #     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 # );
+# ALTER TABLE ubicacion ADD COLUMN latitud FLOAT, ADD COLUMN longitud FLOAT;
+# CREATE INDEX ubicacion_latitud_longitud_idx ON ubicacion (latitud, longitud);
+# -- Solo con GEO_BACKEND=postgis:
+# CREATE INDEX ubicacion_geog_idx ON ubicacion USING GIST ((ST_SetSRID(ST_MakePoint(longitud, latitud), 4326)::geography));
+# CREATE INDEX ubicacion_geom_idx ON ubicacion USING GIST ((ST_SetSRID(ST_MakePoint(longitud, latitud), 4326)));
 ubicacion_parser = reqparse.RequestParser()
 ubicacion_parser.add_argument('nombre', type=str, help='Opcional: Nombre de la ubicación')
 
 ubicacion_client = Namespace('ubicacion', description='Ubicación de la base de datos')
 @ubicacion_client.route('/')
 class Ubicacion(Resource):
-    @api.expect(generic_parser, ubicacion_parser)
+    @api.expect(generic_parser, ubicacion_parser, geo_parser)
     def get(self):
         args = generic_parser.parse_args()
         another_args = ubicacion_parser.parse_args()
+        geo_args = geo_parser.parse_args()
 
         nombre = another_args.get('nombre')
 
-        page = args.get('page')
-        page_size = args.get('page_size')
-        offset = (page - 1) * page_size
-
         columns = [
             'id',
             'nombre',
@@ -215,21 +661,18 @@ class Ubicacion(Resource):
         ]
 
         query = """
-            SELECT
-                id,
-                nombre,
-                created_at,
-                updated_at
+            SELECT {select}
             FROM ubicacion
             WHERE
                 (%s IS NULL OR nombre = %s)
-            LIMIT %s OFFSET %s;
+                AND {geo_filter}
+            ORDER BY {geo_order}id
         """
 
-        params = (nombre, nombre, page_size, offset)
+        params = (nombre, nombre)
 
         try:
-            result = execute_query(query, columns, params)
+            result = execute_page(query, columns, params, args, 'ubicacion', has_filters(another_args) or has_filters(geo_args), geo=build_geo_filter(geo_args), optional_columns=GEO_COLUMNS)
             return jsonify(result)
         except PGError as e:
             return jsonify({'message': str(e)})
@@ -264,7 +707,7 @@ proyectos_parser.add_argument('propietario', type=str, help='Opcional: Propietar
 proyectos_parser.add_argument('tipo_propiedad', type=str, help='Opcional: Tipo de propiedad del proyecto')
 proyectos_parser.add_argument('socios', type=str, help='Opcional: Socios del proyecto')
 proyectos_parser.add_argument('rfc', type=str, help='Opcional: RFC del proyecto')
-proyectos_parser.add_argument('tiene_garantia', type=bool, help='Opcional: ¿Tiene garantía?')
+proyectos_parser.add_argument('tiene_garantia', type=inputs.boolean, help='Opcional: ¿Tiene garantía? (true/false)')
 proyectos_parser.add_argument('vocacion', type=str, help='Opcional: Vocación del proyecto')
 proyectos_parser.add_argument('vocacion_especifica', type=str, help='Opcional: Vocación específica del proyecto')
 proyectos_parser.add_argument('responsable', type=str, help='Opcional: Responsable del proyecto')
@@ -302,10 +745,6 @@ class Proyectos(Resource):
         estatus_legal = another_args.get('estatus_legal')
         ubicacion = another_args.get('ubicacion')
 
-        page = args.get('page')
-        page_size = args.get('page_size')
-        offset = (page - 1) * page_size
-
         columns = [
             'id',
             'clave',
@@ -329,32 +768,7 @@ class Proyectos(Resource):
         ]
 
         query = """
-            SELECT
-                p.id,
-                p.clave,
-                p.prioridad,
-                p.nombre,
-                p.superficie_total,
-                p.propietario,
-                p.tipo_propiedad,
-                p.socios,
-                p.rfc,
-                p.tiene_garantia,
-                p.vocacion,
-                p.vocacion_especifica,
-                p.responsable,
-                p.estatus_activo_no_activo,
-                p.categoria,
-                p.comentarios,
-                p.abogado,
-                p.created_at,
-                p.updated_at,
-                s.id AS sociedad_id,
-                s.porcentaje_participacion,
-                u.id AS ubicacion_id,
-                u.nombre AS ubicacion_nombre,
-                e.id AS estatus_legal_id,
-                e.nombre AS estatus_legal_nombre
+            SELECT {select}
             FROM proyecto p
             LEFT JOIN proyecto_sociedad ps ON p.id = ps.proyecto_id
             LEFT JOIN sociedad s ON ps.sociedad_id = s.id
@@ -380,7 +794,7 @@ class Proyectos(Resource):
                 AND (%s IS NULL OR s.id = %s)
                 AND (%s IS NULL OR u.id = %s)
                 AND (%s IS NULL OR e.id = %s)
-            LIMIT %s OFFSET %s;
+            ORDER BY p.id, s.id, u.id, e.id
         """
 
         params = (
@@ -401,12 +815,11 @@ class Proyectos(Resource):
             abogado, abogado,
             sociedad, sociedad,
             ubicacion, ubicacion,
-            estatus_legal, estatus_legal,
-            page_size, offset
+            estatus_legal, estatus_legal
         )
 
         try:
-            result = execute_query(query, columns, params)
+            result = execute_page(query, columns, params, args, 'proyecto', has_filters(another_args), prefix='p.', filters=another_args, joined=True)
             return jsonify(result)
         except PGError as e:
             return jsonify({'message': str(e)})
@@ -433,10 +846,6 @@ class ProyectoSociedad(Resource):
 
         valor = another_args.get('valor')
 
-        page = args.get('page')
-        page_size = args.get('page_size')
-        offset = (page - 1) * page_size
-
         columns = [
             'id',
             'valor',
@@ -447,23 +856,17 @@ class ProyectoSociedad(Resource):
         ]
 
         query = """
-            SELECT
-                id,
-                valor,
-                proyecto_id,
-                sociedad_id,
-                created_at,
-                updated_at
+            SELECT {select}
             FROM proyecto_sociedad
             WHERE
                 (%s IS NULL OR valor = %s)
-            LIMIT %s OFFSET %s;
+            ORDER BY id
         """
 
-        params = (valor, valor, page_size, offset)
+        params = (valor, valor)
 
         try:
-            result = execute_query(query, columns, params)
+            result = execute_page(query, columns, params, args, 'proyecto_sociedad', has_filters(another_args))
             return jsonify(result)
         except PGError as e:
             return jsonify({'message': str(e)})
@@ -490,10 +893,6 @@ class ProyectoEstatusUbicacion(Resource):
     def get(self):
         args = generic_parser.parse_args()
 
-        page = args.get('page')
-        page_size = args.get('page_size')
-        offset = (page - 1) * page_size
-
         columns = [
             'id',
             'proyecto_id',
@@ -504,21 +903,15 @@ class ProyectoEstatusUbicacion(Resource):
         ]
 
         query = """
-            SELECT
-                id,
-                proyecto_id,
-                ubicacion_id,
-                estatus_legal_id,
-                created_at,
-                updated_at
+            SELECT {select}
             FROM proyecto_estatus_ubicacion
-            LIMIT %s OFFSET %s;
+            ORDER BY id
         """
 
-        params = (page_size, offset)
+        params = ()
 
         try:
-            result = execute_query(query, columns, params)
+            result = execute_page(query, columns, params, args, 'proyecto_estatus_ubicacion')
             return jsonify(result)
         except PGError as e:
             return jsonify({'message': str(e)})
@@ -537,9 +930,16 @@ class ProyectoEstatusUbicacion(Resource):
 #     anios_pend_predial INT,
 #     comentarios TEXT,
 #     proyecto_id INT NOT NULL REFERENCES proyecto(id) ON DELETE CASCADE,
+#     latitud FLOAT,
+#     longitud FLOAT,
 #     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
 #     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 # );
+# ALTER TABLE propiedad ADD COLUMN latitud FLOAT, ADD COLUMN longitud FLOAT;
+# CREATE INDEX propiedad_latitud_longitud_idx ON propiedad (latitud, longitud);
+# -- Solo con GEO_BACKEND=postgis:
+# CREATE INDEX propiedad_geog_idx ON propiedad USING GIST ((ST_SetSRID(ST_MakePoint(longitud, latitud), 4326)::geography));
+# CREATE INDEX propiedad_geom_idx ON propiedad USING GIST ((ST_SetSRID(ST_MakePoint(longitud, latitud), 4326)));
 propiedades_parser = reqparse.RequestParser()
 propiedades_parser.add_argument('clave', type=str, help='Opcional: Clave de la propiedad')
 propiedades_parser.add_argument('nombre', type=str, help='Opcional: Nombre de la propiedad')
@@ -556,10 +956,11 @@ propiedades_parser.add_argument('proyecto_id', type=int, help='Opcional: ID del
 propiedades_client = Namespace('propiedades', description='Propiedades de la base de datos')
 @propiedades_client.route('/')
 class Propiedades(Resource):
-    @api.expect(generic_parser, propiedades_parser)
+    @api.expect(generic_parser, propiedades_parser, geo_parser)
     def get(self):
         args = generic_parser.parse_args()
         another_args = propiedades_parser.parse_args()
+        geo_args = geo_parser.parse_args()
 
         clave = another_args.get('clave')
         nombre = another_args.get('nombre')
@@ -573,10 +974,6 @@ class Propiedades(Resource):
         anios_pend_predial = another_args.get('anios_pend_predial')
         proyecto_id = another_args.get('proyecto_id')
 
-        page = args.get('page')
-        page_size = args.get('page_size')
-        offset = (page - 1) * page_size
-
         columns = [
             'id',
             'clave',
@@ -596,22 +993,7 @@ class Propiedades(Resource):
         ]
 
         query = """
-            SELECT
-                id,
-                clave,
-                nombre,
-                superficie,
-                valor_comercial,
-                valor_comercial_usd,
-                anio_valor_comercial,
-                clave_catastral,
-                base_predial,
-                adeudo_predial,
-                anios_pend_predial,
-                comentarios,
-                proyecto_id,
-                created_at,
-                updated_at
+            SELECT {select}
             FROM propiedad
             WHERE
                 (%s IS NULL OR clave = %s)
@@ -625,7 +1007,8 @@ class Propiedades(Resource):
                 AND (%s IS NULL OR adeudo_predial = %s)
                 AND (%s IS NULL OR anios_pend_predial = %s)
                 AND (%s IS NULL OR proyecto_id = %s)
-            LIMIT %s OFFSET %s;
+                AND {geo_filter}
+            ORDER BY {geo_order}id
         """
 
         params = (
@@ -639,12 +1022,11 @@ class Propiedades(Resource):
             base_predial, base_predial,
             adeudo_predial, adeudo_predial,
             anios_pend_predial, anios_pend_predial,
-            proyecto_id, proyecto_id,
-            page_size, offset
+            proyecto_id, proyecto_id
         )
 
         try:
-            result = execute_query(query, columns, params)
+            result = execute_page(query, columns, params, args, 'propiedad', has_filters(another_args) or has_filters(geo_args), geo=build_geo_filter(geo_args), filters=another_args, optional_columns=GEO_COLUMNS)
             return jsonify(result)
         except PGError as e:
             return jsonify({'message': str(e)})
@@ -715,10 +1097,6 @@ class Renta(Resource):
         vigencia = another_args.get('vigencia')
         tiempo_restante = another_args.get('tiempo_restante')
 
-        page = args.get('page')
-        page_size = args.get('page_size')
-        offset = (page - 1) * page_size
-
         columns = [
             'id',
             'nombre_comercial',
@@ -746,30 +1124,7 @@ class Renta(Resource):
         ]
 
         query = """
-            SELECT 
-                id,
-                nombre_comercial,
-                razon_social,
-                renta_iva_incluida,
-                deposito_garantia_concepto,
-                deposito_garantia_renta,
-                meses_gracia_concepto,
-                meses_gracia_fecha_inicio,
-                meses_gracia_fecha_fin,
-                renta_anticipada_concepto,
-                renta_anticipada_fecha_inicio,
-                renta_anticipada_fecha_fin,
-                renta_anticipada_renta_iva_incluida,
-                incremento_mes,
-                incremento_descripcion,
-                inicio_vigencia,
-                fin_vigencia_forzosa,
-                fin_vigencia_no_forzosa,
-                vigencia,
-                tiempo_restante,
-                incidencias,
-                created_at,
-                updated_at
+            SELECT {select}
             FROM renta
             WHERE
                 (%s IS NULL OR nombre_comercial = %s)
@@ -787,7 +1142,7 @@ class Renta(Resource):
                 AND (%s IS NULL OR fin_vigencia_no_forzosa = %s)
                 AND (%s IS NULL OR vigencia = %s)
                 AND (%s IS NULL OR tiempo_restante = %s)
-            LIMIT %s OFFSET %s;
+            ORDER BY id
         """
 
         params = (
@@ -805,12 +1160,11 @@ class Renta(Resource):
             fin_vigencia_forzosa, fin_vigencia_forzosa,
             fin_vigencia_no_forzosa, fin_vigencia_no_forzosa,
             vigencia, vigencia,
-            tiempo_restante, tiempo_restante,
-            page_size, offset
+            tiempo_restante, tiempo_restante
         )
 
         try:
-            result = execute_query(query, columns, params)
+            result = execute_page(query, columns, params, args, 'renta', has_filters(another_args), filters=another_args)
             return jsonify(result)
         except PGError as e:
             return jsonify({'message': str(e)})
@@ -837,10 +1191,6 @@ class PropiedadRenta(Resource):
         propiedad_id = another_args.get('propiedad_id')
         renta_id = another_args.get('renta_id')
 
-        page = args.get('page')
-        page_size = args.get('page_size')
-        offset = (page - 1) * page_size
-
         columns = [
             'propiedad_id',
             'renta_id',
@@ -849,26 +1199,441 @@ class PropiedadRenta(Resource):
         ]
 
         query = """
-            SELECT
-                propiedad_id,
-                renta_id,
-                created_at,
-                updated_at
+            SELECT {select}
             FROM propiedad_renta
             WHERE
                 (%s IS NULL OR propiedad_id = %s)
                 AND (%s IS NULL OR renta_id = %s)
-            LIMIT %s OFFSET %s;
+            ORDER BY propiedad_id, renta_id
         """
 
-        params = (propiedad_id, propiedad_id, renta_id, renta_id, page_size, offset)
+        params = (propiedad_id, propiedad_id, renta_id, renta_id)
 
         try:
-            result = execute_query(query, columns, params)
+            result = execute_page(query, columns, params, args, 'propiedad_renta', has_filters(another_args))
             return jsonify(result)
         except PGError as e:
             return jsonify({'message': str(e)})
 
+# Carga masiva: los registros válidos se copian con COPY FROM STDIN a una tabla temporal y desde ahí
+# se hace un solo INSERT ... ON CONFLICT sobre la llave natural de cada tabla
+BULK_TABLES = {
+    'propiedad': {
+        'columns': {
+            'clave': str,
+            'nombre': str,
+            'superficie': float,
+            'valor_comercial': float,
+            'valor_comercial_usd': float,
+            'anio_valor_comercial': int,
+            'clave_catastral': str,
+            'base_predial': float,
+            'adeudo_predial': float,
+            'anios_pend_predial': int,
+            'comentarios': str,
+            'proyecto_id': int,
+            'latitud': float,
+            'longitud': float
+        },
+        'required': ('clave', 'nombre', 'superficie', 'valor_comercial', 'valor_comercial_usd', 'clave_catastral', 'base_predial', 'proyecto_id'),
+        'max_length': dict.fromkeys(('clave', 'nombre', 'clave_catastral'), 255),
+        # Solo se escriben si vienen en la carga, para no exigir el ALTER TABLE a quien no las usa
+        'optional': GEO_COLUMNS,
+        'key': ('clave',),
+        'references': {'proyecto_id': 'proyecto'}
+    },
+    # renta no tiene llave natural: las filas con id actualizan una renta existente y las filas sin id se insertan
+    'renta': {
+        'columns': {
+            'id': int,
+            'nombre_comercial': str,
+            'razon_social': str,
+            'renta_iva_incluida': float,
+            'deposito_garantia_concepto': str,
+            'deposito_garantia_renta': float,
+            'meses_gracia_concepto': str,
+            'meses_gracia_fecha_inicio': date,
+            'meses_gracia_fecha_fin': date,
+            'renta_anticipada_concepto': str,
+            'renta_anticipada_fecha_inicio': date,
+            'renta_anticipada_fecha_fin': date,
+            'renta_anticipada_renta_iva_incluida': float,
+            'incremento_mes': str,
+            'incremento_descripcion': str,
+            'inicio_vigencia': date,
+            'fin_vigencia_forzosa': date,
+            'fin_vigencia_no_forzosa': date,
+            'vigencia': str,
+            'tiempo_restante': str,
+            'incidencias': str
+        },
+        'required': ('nombre_comercial', 'renta_iva_incluida', 'inicio_vigencia', 'fin_vigencia_forzosa'),
+        'max_length': dict.fromkeys((
+            'nombre_comercial', 'razon_social', 'deposito_garantia_concepto', 'meses_gracia_concepto',
+            'renta_anticipada_concepto', 'incremento_mes', 'incremento_descripcion', 'vigencia', 'tiempo_restante'
+        ), 255),
+        'key': None,
+        'references': {'id': 'renta'}
+    },
+    'propiedad_renta': {
+        'columns': {
+            'propiedad_id': int,
+            'renta_id': int
+        },
+        'required': ('propiedad_id', 'renta_id'),
+        'key': ('propiedad_id', 'renta_id'),
+        'references': {'propiedad_id': 'propiedad', 'renta_id': 'renta'}
+    },
+    'proyecto_sociedad': {
+        'columns': {
+            'valor': float,
+            'proyecto_id': int,
+            'sociedad_id': int
+        },
+        'required': ('valor', 'proyecto_id', 'sociedad_id'),
+        'key': ('proyecto_id', 'sociedad_id'),
+        'references': {'proyecto_id': 'proyecto', 'sociedad_id': 'sociedad'}
+    }
+}
+
+BULK_SQL_TYPES = {str: 'TEXT', int: 'INT', float: 'DOUBLE PRECISION', date: 'DATE'}
+BULK_MAX_ERRORS = 1000
+# Todas las columnas enteras de las tablas de carga son INT: un valor fuera de rango haría fallar el COPY completo
+INT4_MIN, INT4_MAX = -2 ** 31, 2 ** 31 - 1
+
+
+def parse_bulk_value(value, kind):
+    if value is None or (isinstance(value, str) and value.strip() == ''):
+        return None
+    if kind is str:
+        return str(value)
+    if isinstance(value, bool):
+        raise ValueError('no se aceptan valores booleanos')
+    if kind is int:
+        # int() truncaría 2.9 a 2 sin avisar
+        if isinstance(value, float) and not value.is_integer():
+            raise ValueError('se esperaba un número entero')
+        number = int(value)
+        if not INT4_MIN <= number <= INT4_MAX:
+            raise ValueError(f'fuera del rango de INT ({INT4_MIN} a {INT4_MAX})')
+        return number
+    if kind is float:
+        number = float(value)
+        if not math.isfinite(number):
+            raise ValueError('el número debe ser finito')
+        return number
+    return date.fromisoformat(str(value))
+
+
+def validate_bulk_row(spec, record):
+    unknown = [column for column in record if column not in spec['columns']]
+    if unknown:
+        raise ValueError(f"columnas desconocidas: {', '.join(unknown)}")
+
+    values = {}
+    for column, kind in spec['columns'].items():
+        try:
+            values[column] = parse_bulk_value(record.get(column), kind)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"{column}: valor inválido {record.get(column)!r} ({e})")
+
+    # Las columnas VARCHAR(n) rechazan textos más largos; se reporta por fila en lugar de abortar la carga
+    for column, max_length in spec.get('max_length', {}).items():
+        if values[column] is not None and len(values[column]) > max_length:
+            raise ValueError(f"{column}: el texto tiene {len(values[column])} caracteres, el máximo es {max_length}")
+
+    missing = [column for column in spec['required'] if values[column] is None]
+    if missing:
+        raise ValueError(f"faltan columnas obligatorias: {', '.join(missing)}")
+    return values
+
+
+def open_bulk_stream():
+    # El cuerpo se descomprime y decodifica a medida que se lee; nunca se guarda completo una segunda vez
+    if request.mimetype not in ('text/csv', 'application/x-ndjson', 'application/jsonl'):
+        abort(415, 'Content-Type debe ser text/csv o application/x-ndjson')
+    if request.content_length is not None and request.content_length > BULK_MAX_BODY_SIZE:
+        abort(413, f'El cuerpo excede BULK_MAX_BODY_SIZE ({BULK_MAX_BODY_SIZE} bytes), envíalo con Content-Encoding: gzip o divide la carga')
+
+    content_encoding = request.headers.get('Content-Encoding', 'identity').strip().lower()
+    if content_encoding == 'gzip':
+        raw = gzip.GzipFile(fileobj=request.stream, mode='rb')
+    elif content_encoding == 'identity':
+        raw = request.stream
+    else:
+        abort(415, 'Content-Encoding debe ser gzip o identity')
+    return io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+
+
+def read_bulk_records(stream):
+    # Devuelve (número de fila, registro o error de lectura) sin cargar todo el cuerpo en memoria
+    if request.mimetype == 'text/csv':
+        for fila, record in enumerate(csv.DictReader(stream), start=1):
+            if None in record:
+                yield fila, ValueError('la fila tiene más valores que columnas en el encabezado')
+            else:
+                yield fila, record
+    elif request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        fila = 0
+        for line in stream:
+            if not line.strip():
+                continue
+            fila += 1
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield fila, ValueError(f'JSON inválido: {e}')
+                continue
+            if not isinstance(record, dict):
+                yield fila, ValueError('cada línea debe ser un objeto JSON')
+            else:
+                yield fila, record
+
+
+class CopyStream:
+    # Objeto tipo archivo para copy_expert: pide líneas al generador solo cuando COPY lee el siguiente bloque
+    def __init__(self, lines):
+        self._lines = lines
+        self._pending = ''
+
+    def read(self, size=-1):
+        chunks = [self._pending]
+        length = len(self._pending)
+        while size < 0 or length < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            chunks.append(line)
+            length += len(line)
+        data = ''.join(chunks)
+        if size < 0:
+            self._pending = ''
+            return data
+        self._pending = data[size:]
+        return data[:size]
+
+
+def copy_text_value(value):
+    if value is None:
+        return '\\N'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def bulk_load(tabla, spec):
+    stream = open_bulk_stream()
+    columns = list(spec['columns'])
+    errors = []
+    present = set()
+    received = 0
+    unreadable = []
+
+    def staging_lines():
+        # COPY consume las filas válidas conforme se leen del cuerpo
+        nonlocal received
+        try:
+            for fila, record in read_bulk_records(stream):
+                received += 1
+                try:
+                    if isinstance(record, Exception):
+                        raise record
+                    values = validate_bulk_row(spec, record)
+                except ValueError as e:
+                    errors.append({'fila': fila, 'error': str(e)})
+                    continue
+                present.update(column for column, value in record.items() if column in spec['columns'])
+                yield '\t'.join([str(fila)] + [copy_text_value(values[column]) for column in columns]) + '\n'
+        except (UnicodeDecodeError, csv.Error, OSError, EOFError, zlib.error) as e:
+            # El error no se propaga dentro de copy_expert: se corta el COPY y se reporta al terminar
+            unreadable.append(e)
+
+    staging_columns = ', '.join(f"{column} {BULK_SQL_TYPES[kind]}" for column, kind in spec['columns'].items())
+
+    inserted = updated = 0
+    connection = create_connection()
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SET statement_timeout = %s;", (get_query_limits('carga')['statement_timeout_ms'],))
+        cursor.execute(f"CREATE TEMP TABLE carga_staging (fila INT, {staging_columns}) ON COMMIT DROP;")
+        cursor.copy_expert(f"COPY carga_staging (fila, {', '.join(columns)}) FROM STDIN;", CopyStream(staging_lines()))
+        if unreadable:
+            connection.rollback()
+            abort(400, f'No se pudo leer el cuerpo de la carga: {unreadable[0]}')
+
+        key = spec['key']
+        # Las columnas opcionales que no vienen en la carga no se escriben en la tabla destino
+        target_columns = [column for column in columns if column not in spec.get('optional', ()) or column in present]
+        # Solo se actualizan las columnas que vienen en la carga; las demás conservan su valor
+        update_columns = [column for column in target_columns if column in present and column not in (key or ('id',))]
+        column_list = ', '.join(target_columns)
+
+        for column, referenced in spec['references'].items():
+            cursor.execute(f"""
+                DELETE FROM carga_staging s
+                WHERE s.{column} IS NOT NULL
+                    AND NOT EXISTS (SELECT 1 FROM {referenced} r WHERE r.id = s.{column})
+                RETURNING s.fila, s.{column};
+            """)
+            for fila, value in cursor.fetchall():
+                errors.append({'fila': fila, 'error': f"{column}: no existe {referenced} con id {value}"})
+
+        if key:
+            key_list = ', '.join(key)
+            if update_columns:
+                assignments = ', '.join(f"{column} = EXCLUDED.{column}" for column in update_columns)
+                changed = (
+                    f"({', '.join(f'{tabla}.{column}' for column in update_columns)}) IS DISTINCT FROM "
+                    f"({', '.join(f'EXCLUDED.{column}' for column in update_columns)})"
+                )
+                conflict = f"DO UPDATE SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE {changed}"
+            else:
+                conflict = "DO NOTHING"
+            # DISTINCT ON deja solo la última aparición de cada llave dentro de la misma carga
+            cursor.execute(f"""
+                WITH upserted AS (
+                    INSERT INTO {tabla} ({column_list})
+                    SELECT DISTINCT ON ({key_list}) {column_list}
+                    FROM carga_staging
+                    ORDER BY {key_list}, fila DESC
+                    ON CONFLICT ({key_list}) {conflict}
+                    RETURNING (xmax = 0) AS inserted
+                )
+                SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) FROM upserted;
+            """)
+            inserted, updated = cursor.fetchone()
+        else:
+            insert_columns = ', '.join(column for column in target_columns if column != 'id')
+            cursor.execute(f"""
+                INSERT INTO {tabla} ({insert_columns})
+                SELECT {insert_columns} FROM carga_staging WHERE id IS NULL ORDER BY fila;
+            """)
+            inserted = cursor.rowcount
+            if update_columns:
+                assignments = ', '.join(f"{column} = s.{column}" for column in update_columns)
+                changed = (
+                    f"({', '.join(f't.{column}' for column in update_columns)}) IS DISTINCT FROM "
+                    f"({', '.join(f's.{column}' for column in update_columns)})"
+                )
+                cursor.execute(f"""
+                    UPDATE {tabla} t
+                    SET {assignments}, updated_at = CURRENT_TIMESTAMP
+                    FROM (
+                        SELECT DISTINCT ON (id) * FROM carga_staging WHERE id IS NOT NULL ORDER BY id, fila DESC
+                    ) s
+                    WHERE t.id = s.id AND {changed};
+                """)
+                updated = cursor.rowcount
+
+        connection.commit()
+    except psycopg2.Error as e:
+        connection.rollback()
+        print(f"Database error: {e}")
+        raise
+    finally:
+        cursor.close()
+        connection.close()
+
+    # clear() cambia la generación y cada snapshot (también los de otros workers) se recarga completo: una carga
+    # larga escribe updated_at con la hora de inicio de su transacción y el refresco incremental podría no verla
+    response_cache.clear()
+    for snapshot in list(snapshots.values()):
+        snapshot.refresh_soon()
+
+    errors.sort(key=lambda error: error['fila'])
+    rejected = len(errors)
+    return {
+        'tabla': tabla,
+        'recibidas': received,
+        'insertadas': inserted,
+        'actualizadas': updated,
+        'sin_cambios': received - rejected - inserted - updated,
+        'rechazadas': rejected,
+        'errores': errors[:BULK_MAX_ERRORS]
+    }
+
+
+carga_client = Namespace('carga', description=f'Carga masiva de registros (CSV o NDJSON, opcionalmente con Content-Encoding: gzip; máximo {BULK_MAX_BODY_SIZE // (1024 * 1024)} MiB por petición)')
+@carga_client.route('/<string:tabla>')
+@carga_client.doc(params={'tabla': f"Tabla destino: {', '.join(BULK_TABLES)}"})
+class Carga(Resource):
+    def post(self, tabla):
+        if not BULK_LOAD_TOKEN:
+            abort(403, 'La carga masiva está deshabilitada (BULK_LOAD_TOKEN no configurado)')
+        if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {BULK_LOAD_TOKEN}'.encode()):
+            abort(401, 'Token de carga inválido')
+
+        spec = BULK_TABLES.get(tabla)
+        if spec is None:
+            abort(404, f"Tabla desconocida: {tabla}. Tablas disponibles: {', '.join(BULK_TABLES)}")
+
+        try:
+            with get_admission_gate('carga').admit(QUEUE_TIMEOUT):
+                result = bulk_load(tabla, spec)
+            return jsonify(result)
+        except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+            # La carga completa se revirtió: el error viene de los datos y no de la conexión
+            return {'message': str(e)}, 422
+        except PGError as e:
+            return {'message': str(e)}, 500
+
+BATCH_NAMESPACES = {
+    namespace.name: namespace
+    for namespace in (
+        sociedades_client,
+        estatus_legal_client,
+        ubicacion_client,
+        proyectos_client,
+        proyecto_sociedad_client,
+        proyecto_estatus_ubicacion_client,
+        propiedades_client,
+        renta_client,
+        propiedad_renta_client
+    )
+}
+
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix='batch')
+
+batch_client = Namespace('batch', description='Varias consultas de lectura en una sola petición')
+
+batch_item_model = batch_client.model('BatchItem', {
+    'namespace': fields.String(required=True, description='Namespace a consultar', enum=list(BATCH_NAMESPACES)),
+    'args': fields.Raw(description='Mismos parámetros que acepta el namespace (page, page_size, fields, filtros...)')
+})
+batch_model = batch_client.model('Batch', {
+    'requests': fields.List(fields.Nested(batch_item_model), required=True, description=f'Hasta {BATCH_MAX_ITEMS} consultas')
+})
+
+
+def run_batch_item(namespace, args):
+    # Cada consulta pasa por el mismo despacho que una petición normal (caché, límites de concurrencia, pool)
+    with app.test_request_context(f'/{namespace}/', method='GET', query_string=args):
+        try:
+            response = app.full_dispatch_request()
+        except Exception as e:
+            print(f"Unexpected error: {e}")
+            return {'namespace': namespace, 'status': 500, 'body': {'message': str(e)}}
+        return {'namespace': namespace, 'status': response.status_code, 'body': response.get_json(silent=True)}
+
+
+@batch_client.route('/')
+class Batch(Resource):
+    @batch_client.expect(batch_model)
+    def post(self):
+        payload = request.get_json(silent=True)
+        items = payload.get('requests') if isinstance(payload, dict) else None
+        if not isinstance(items, list) or not items:
+            abort(400, 'El cuerpo debe ser {"requests": [{"namespace": ..., "args": {...}}]}')
+        if len(items) > BATCH_MAX_ITEMS:
+            abort(400, f'Se permiten como máximo {BATCH_MAX_ITEMS} consultas por petición')
+
+        for item in items:
+            if not isinstance(item, dict) or item.get('namespace') not in BATCH_NAMESPACES:
+                abort(400, f"Cada consulta necesita un namespace válido: {', '.join(BATCH_NAMESPACES)}")
+            if not isinstance(item.get('args', {}), dict):
+                abort(400, 'args debe ser un objeto')
+
+        futures = [batch_executor.submit(run_batch_item, item['namespace'], item.get('args') or {}) for item in items]
+        return jsonify({'results': [future.result() for future in futures]})
+
 api.add_namespace(sociedades_client)
 api.add_namespace(estatus_legal_client)
 api.add_namespace(ubicacion_client)
@@ -877,4 +1642,9 @@ api.add_namespace(proyecto_sociedad_client)
 api.add_namespace(proyecto_estatus_ubicacion_client)
 api.add_namespace(propiedades_client)
 api.add_namespace(renta_client)
-api.add_namespace(propiedad_renta_client)
\ No newline at end of file
+api.add_namespace(propiedad_renta_client)
+api.add_namespace(carga_client)
+api.add_namespace(batch_client)
+
+if __name__ == '__main__':
+    app.run(host=os.getenv('HOST', '0.0.0.0'), port=int(os.getenv('PORT', 8000)))
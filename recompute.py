@@ -0,0 +1,145 @@
+# requiere numpy = pip install numpy
+# recalcular valuaciones y predial = python3 recompute.py --tarifas tarifas.csv [--anio 2024] [--dry-run]
+#
+# tarifas.csv (una fila por año):
+#     anio,tipo_cambio,tasa_predial,recargo_anual
+#     2023,17.76,0.0012,0.0147
+#     ...
+# tipo_cambio = pesos por dólar, tasa_predial = fracción de base_predial por año,
+# recargo_anual = fracción que se acumula por cada año de atraso
+
+import csv
+import sys
+import time
+import argparse
+import numpy as np
+from psycopg2.extras import execute_values
+
+from db import create_connection
+
+READ_QUERY = """
+    SELECT id, valor_comercial, base_predial, anios_pend_predial, valor_comercial_usd, adeudo_predial
+    FROM propiedad
+    ORDER BY id;
+"""
+
+# Solo se tocan las filas que cambian para que updated_at refleje cambios reales
+UPDATE_QUERY = """
+    UPDATE propiedad AS p
+    SET
+        valor_comercial_usd = v.valor_comercial_usd,
+        adeudo_predial = v.adeudo_predial,
+        updated_at = CURRENT_TIMESTAMP
+    FROM (VALUES %s) AS v(id, valor_comercial_usd, adeudo_predial)
+    WHERE p.id = v.id
+"""
+
+
+def load_tariffs(path):
+    tariffs = {}
+    with open(path, newline='', encoding='utf-8-sig') as file:
+        for row in csv.DictReader(file):
+            tariffs[int(row['anio'])] = (float(row['tipo_cambio']), float(row['tasa_predial']), float(row['recargo_anual']))
+    if not tariffs:
+        raise ValueError(f"{path} no tiene tarifas")
+    return tariffs
+
+
+def debt_factors(tariffs, year, max_years):
+    # factors[k] = adeudo por peso de base_predial con k años pendientes:
+    # suma de tasa_predial de cada año pendiente más el recargo acumulado por los años de atraso
+    factors = np.zeros(max_years + 1)
+    for k in range(1, max_years + 1):
+        pending_year = year - (k - 1)
+        if pending_year not in tariffs:
+            factors[k:] = np.nan
+            break
+        _, rate, surcharge = tariffs[pending_year]
+        factors[k] = factors[k - 1] + rate * (1 + surcharge * (k - 1))
+    return factors
+
+
+def recompute_chunk(chunk, exchange_rate, factors):
+    data = np.array(chunk, dtype=np.float64)  # None -> NaN
+    ids = data[:, 0].astype(np.int64)
+    valor_comercial, base_predial, anios_pend = data[:, 1], data[:, 2], data[:, 3]
+    old_usd, old_debt = data[:, 4], data[:, 5]
+
+    usd = np.round(valor_comercial / exchange_rate, 2)
+
+    # Sin años pendientes registrados, o con años fuera de la tabla de tarifas, se conserva el adeudo capturado
+    has_years = ~np.isnan(anios_pend)
+    in_range = has_years & (anios_pend >= 0) & (anios_pend < len(factors))
+    factor = factors[np.where(in_range, anios_pend, 0).astype(np.int64)]
+    computable = in_range & ~np.isnan(factor)
+    debt = np.where(computable, np.round(base_predial * factor, 2), old_debt)
+    skipped = int(np.count_nonzero(has_years & ~computable))
+
+    # NaN representa NULL en ambos lados: NULL = NULL no es un cambio y NaN se escribe como NULL
+    usd_changed = ~((usd == old_usd) | (np.isnan(usd) & np.isnan(old_usd)))
+    debt_changed = ~((debt == old_debt) | (np.isnan(debt) & np.isnan(old_debt)))
+    changed = usd_changed | debt_changed
+
+    values = [
+        (int(row_id), None if np.isnan(row_usd) else float(row_usd), None if np.isnan(row_debt) else float(row_debt))
+        for row_id, row_usd, row_debt in zip(ids[changed], usd[changed], debt[changed])
+    ]
+    return values, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Recalcula valor_comercial_usd y adeudo_predial de todas las propiedades')
+    parser.add_argument('--tarifas', required=True, help='CSV con anio,tipo_cambio,tasa_predial,recargo_anual')
+    parser.add_argument('--anio', type=int, help='Año de la valuación (por defecto el más reciente de las tarifas)')
+    parser.add_argument('--chunk', type=int, default=20000, help='Filas por lote')
+    parser.add_argument('--max-anios', type=int, default=30, help='Máximo de años pendientes de predial considerados')
+    parser.add_argument('--dry-run', action='store_true', help='Calcula y reporta sin escribir en la base de datos')
+    args = parser.parse_args()
+
+    tariffs = load_tariffs(args.tarifas)
+    year = args.anio or max(tariffs)
+    if year not in tariffs:
+        parser.error(f"No hay tarifa para {year}")
+    exchange_rate = tariffs[year][0]
+    factors = debt_factors(tariffs, year, args.max_anios)
+
+    # El cursor con nombre lee del lado del servidor por lotes; las escrituras van por otra conexión
+    read_connection = create_connection()
+    write_connection = None if args.dry_run else create_connection()
+    cursor = read_connection.cursor(name='recompute_propiedad')
+    cursor.itersize = args.chunk
+
+    read = updated = skipped = 0
+    started = time.perf_counter()
+    try:
+        cursor.execute(READ_QUERY)
+        while True:
+            chunk = cursor.fetchmany(args.chunk)
+            if not chunk:
+                break
+            values, chunk_skipped = recompute_chunk(chunk, exchange_rate, factors)
+            if values and write_connection is not None:
+                with write_connection.cursor() as write_cursor:
+                    execute_values(write_cursor, UPDATE_QUERY, values, template='(%s, %s::float8, %s::float8)', page_size=len(values))
+                write_connection.commit()
+
+            read += len(chunk)
+            updated += len(values)
+            skipped += chunk_skipped
+            elapsed = time.perf_counter() - started
+            print(f"{read} filas leídas, {updated} actualizadas, {read / elapsed:.0f} filas/s")
+    finally:
+        cursor.close()
+        read_connection.close()
+        if write_connection is not None:
+            write_connection.close()
+
+    elapsed = time.perf_counter() - started
+    action = 'por actualizar (dry-run)' if args.dry_run else 'actualizadas'
+    print(f"Listo: {read} propiedades en {elapsed:.2f} s, {updated} {action}, {skipped} sin tarifa para sus años pendientes")
+    print(f"Tipo de cambio {year}: {exchange_rate}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
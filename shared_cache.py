@@ -0,0 +1,109 @@
+# Caché de respuestas compartida entre los workers de launcher.py
+# Se crea en el proceso maestro antes del fork: la región mmap anónima queda compartida con todos los hijos
+
+import mmap
+import time
+import pickle
+import struct
+import hashlib
+import multiprocessing
+
+# generación (Q) al inicio de la región; cada slot: secuencia (Q) y encabezado con hash de la llave (Q),
+# generación en que se escribió (Q), expiración (d) y tamaño (I)
+GENERATION = struct.Struct('<Q')
+SEQUENCE = struct.Struct('<Q')
+SLOT_HEADER = struct.Struct('<QQdI')
+# Las escrituras esperan el lock a lo sumo este tiempo: si un worker murió con el lock tomado (OOM, SIGKILL),
+# los demás siguen atendiendo y guardan sus respuestas en la caché local
+LOCK_TIMEOUT = 0.01
+
+
+class SharedResponseCache:
+    def __init__(self, ttl, slots=1024, slot_size=64 * 1024, local=None):
+        self.ttl = ttl
+        self.slots = slots
+        self.slot_size = slot_size
+        # Las respuestas que no caben en un slot se guardan en la caché local de cada proceso
+        self.local = local
+        self._memory = mmap.mmap(-1, GENERATION.size + slots * slot_size)
+        self._lock = multiprocessing.get_context('fork').Lock()
+
+    def _slot(self, key):
+        digest = int.from_bytes(hashlib.blake2b(repr(key).encode(), digest_size=8).digest(), 'little')
+        return digest, GENERATION.size + (digest % self.slots) * self.slot_size
+
+    def _generation(self):
+        return GENERATION.unpack_from(self._memory, 0)[0]
+
+    @property
+    def generation(self):
+        return self._generation()
+
+    def _read_slot(self, digest, offset, generation):
+        # Lectura sin lock (seqlock): la secuencia es impar mientras alguien escribe el slot, y si cambia
+        # durante la lectura la copia puede estar a medias y se descarta
+        sequence = SEQUENCE.unpack_from(self._memory, offset)[0]
+        if sequence & 1:
+            return None
+        stored_digest, stored_generation, expires_at, size = SLOT_HEADER.unpack_from(self._memory, offset + SEQUENCE.size)
+        if stored_digest != digest or stored_generation != generation or not size or expires_at < time.time():
+            return None
+        start = offset + SEQUENCE.size + SLOT_HEADER.size
+        payload = self._memory[start:start + min(size, self.slot_size)]
+        if SEQUENCE.unpack_from(self._memory, offset)[0] != sequence:
+            return None
+        return payload
+
+    def get(self, key):
+        digest, offset = self._slot(key)
+        generation = self._generation()
+        payload = self._read_slot(digest, offset, generation)
+
+        if payload is not None:
+            try:
+                stored_key, value = pickle.loads(payload)
+            except Exception:
+                stored_key = value = None
+            if stored_key == key:
+                return value
+
+        if self.local is not None:
+            entry = self.local.get(key)
+            if entry is not None and entry[0] == generation:
+                return entry[1]
+        return None
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+        generation = self._generation()
+        payload = pickle.dumps((key, value), protocol=pickle.HIGHEST_PROTOCOL)
+        digest, offset = self._slot(key)
+        if SEQUENCE.size + SLOT_HEADER.size + len(payload) > self.slot_size or not self._lock.acquire(timeout=LOCK_TIMEOUT):
+            if self.local is not None:
+                self.local.set(key, (generation, value))
+            return
+
+        # Slots de asignación directa: una llave nueva reemplaza a la que ocupaba el mismo slot
+        try:
+            # | 1 también cubre un slot que quedó impar porque su escritor murió a la mitad
+            writing = SEQUENCE.unpack_from(self._memory, offset)[0] | 1
+            SEQUENCE.pack_into(self._memory, offset, writing)
+            start = offset + SEQUENCE.size + SLOT_HEADER.size
+            self._memory[start:start + len(payload)] = payload
+            SLOT_HEADER.pack_into(self._memory, offset + SEQUENCE.size, digest, generation, time.time() + self.ttl, len(payload))
+            SEQUENCE.pack_into(self._memory, offset, writing + 1)
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        # Cambiar la generación invalida todos los slots y también las entradas locales de los demás workers.
+        # Si el lock no se obtiene se cambia de todos modos: invalidar es más importante que no perder un incremento
+        acquired = self._lock.acquire(timeout=LOCK_TIMEOUT)
+        try:
+            GENERATION.pack_into(self._memory, 0, self._generation() + 1)
+        finally:
+            if acquired:
+                self._lock.release()
+        if self.local is not None:
+            self.local.clear()
@@ -0,0 +1,114 @@
+import os
+import sys
+import time
+import threading
+from types import SimpleNamespace
+
+import pytest
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+# main.py exige la configuración de la base de datos al importarse; las pruebas nunca se conectan a ella
+for variable, value in {
+    'DB_HOST': 'localhost',
+    'DB_PORT': '5432',
+    'DB_USER': 'test',
+    'DB_NAME': 'test',
+    'DB_PASSWORD': 'test'
+}.items():
+    os.environ.setdefault(variable, value)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+        self.rowcount = 0
+
+    def execute(self, query, params=None):
+        self.connection.queries.append(query)
+        database = self.connection.database
+        if database.block is not None and database.block[0] in query:
+            database.block[1].wait(10)
+        if database.delay:
+            time.sleep(database.delay)
+        self.rows = next((rows for text, rows in database.results.items() if text in query), [])
+
+    def copy_expert(self, query, file, size=8192):
+        self.connection.queries.append(query)
+        while True:
+            chunk = file.read(size)
+            if not chunk:
+                break
+            self.connection.copied.append(chunk)
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    # Suficiente para execute_page: registra las consultas y devuelve páginas vacías
+    def __init__(self, database):
+        self.database = database
+        self.queries = []
+        self.copied = []
+        self.closed = 0
+        self.info = SimpleNamespace(transaction_status=TRANSACTION_STATUS_IDLE)
+
+    def cursor(self, cursor_factory=None, name=None):
+        return FakeCursor(self)
+
+    def rollback(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.opened = []
+        # (texto de la consulta, threading.Event): las consultas que contienen el texto esperan al evento
+        self.block = None
+        # segundos que tarda cada consulta
+        self.delay = 0
+        # texto de la consulta -> filas que devuelve
+        self.results = {}
+        self._lock = threading.Lock()
+
+    def connect(self, *args, **kwargs):
+        connection = FakeConnection(self)
+        with self._lock:
+            self.opened.append(connection)
+        return connection
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    # Sustituye psycopg2.connect para que el pool y create_connection abran conexiones falsas
+    database = FakeDatabase()
+    monkeypatch.setattr(main.psycopg2, 'connect', database.connect)
+    monkeypatch.setattr(main, 'connection_pool', None)
+    yield database
+    if main.connection_pool is not None:
+        main.connection_pool.closeall()
+        main.connection_pool = None
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main.response_cache, 'ttl', 0)
+    monkeypatch.setattr(main, 'admission_gates', {})
+    return main.app.test_client()
@@ -0,0 +1,33 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import main
+
+
+def test_heavy_tables_leave_worker_threads_free():
+    heavy = sum(
+        limits['max_concurrent'] + limits['max_queued']
+        for table, limits in main.QUERY_LIMITS.items()
+    )
+    assert heavy < main.WORKER_THREADS
+
+
+def test_full_proyecto_gate_does_not_block_lookups(fake_db, client):
+    release = threading.Event()
+    fake_db.block = ('FROM proyecto', release)
+
+    # Mismo número de hilos con que hypercorn atiende las peticiones de un worker
+    with ThreadPoolExecutor(max_workers=main.WORKER_THREADS) as executor:
+        try:
+            proyectos = [executor.submit(client.get, '/proyectos/') for _ in range(main.WORKER_THREADS * 3)]
+            # Las consultas sin cupo se rechazan de inmediato en lugar de ocupar un hilo durante QUEUE_TIMEOUT
+            lookup = executor.submit(client.get, '/sociedades/').result(timeout=main.QUEUE_TIMEOUT / 2)
+            assert lookup.status_code == 200
+            assert lookup.get_json()['data'] == []
+        finally:
+            release.set()
+
+        statuses = [future.result(timeout=10).status_code for future in proyectos]
+
+    assert statuses.count(200) == main.QUERY_LIMITS['proyecto']['max_concurrent']
+    assert statuses.count(429) == len(statuses) - statuses.count(200)
@@ -0,0 +1,58 @@
+import main
+
+
+def batch(client, *items):
+    return client.post('/batch/', json={'requests': list(items)})
+
+
+def test_each_item_reports_its_own_status(fake_db, client):
+    response = batch(
+        client,
+        {'namespace': 'sociedades', 'args': {'page_size': 5}},
+        {'namespace': 'estatus_legal', 'args': {'page': 'abc'}},
+        {'namespace': 'ubicacion'}
+    )
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [(item['namespace'], item['status']) for item in results] == [
+        ('sociedades', 200), ('estatus_legal', 400), ('ubicacion', 200)
+    ]
+    assert results[0]['body']['page_size'] == 5
+    assert 'page' in results[1]['body']['errors']
+
+
+def test_rejects_invalid_batches(fake_db, client, monkeypatch):
+    monkeypatch.setattr(main, 'BATCH_MAX_ITEMS', 2)
+    too_many = [{'namespace': 'sociedades'}] * 3
+    assert batch(client, *too_many).status_code == 400
+    assert batch(client, {'namespace': 'carga'}).status_code == 400
+    assert batch(client, {'namespace': 'sociedades', 'args': ['page', 1]}).status_code == 400
+    assert batch(client, 'sociedades').status_code == 400
+    assert client.post('/batch/', json={'requests': []}).status_code == 400
+    assert client.post('/batch/', data='no es json', content_type='text/plain').status_code == 400
+    # Ninguna consulta se ejecuta si la petición es inválida
+    assert not fake_db.opened
+
+
+def test_items_share_the_response_cache(fake_db, client, monkeypatch):
+    monkeypatch.setattr(main, 'response_cache', main.ResponseCache(60, 16))
+    assert client.get('/sociedades/?page_size=5').status_code == 200
+    queries = sum(len(connection.queries) for connection in fake_db.opened)
+
+    results = batch(client, {'namespace': 'sociedades', 'args': {'page_size': 5}}).get_json()['results']
+    assert results[0]['status'] == 200
+    assert sum(len(connection.queries) for connection in fake_db.opened) == queries
+
+
+def test_items_share_the_admission_gates(fake_db, client):
+    gate = main.get_admission_gate('proyecto')
+    held = main.QUERY_LIMITS['proyecto']['max_concurrent']
+    for _ in range(held):
+        gate._slots.acquire()
+    try:
+        results = batch(client, {'namespace': 'proyectos'}, {'namespace': 'sociedades'}).get_json()['results']
+    finally:
+        for _ in range(held):
+            gate._slots.release()
+
+    assert [item['status'] for item in results] == [429, 200]
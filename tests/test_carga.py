@@ -0,0 +1,122 @@
+import gzip
+import json
+
+import main
+from conftest import FakeCursor
+
+TOKEN = 'secreto'
+
+
+def ndjson(count):
+    return ''.join(
+        json.dumps({'propiedad_id': index, 'renta_id': index}) + '\n'
+        for index in range(1, count + 1)
+    ).encode()
+
+
+def post(client, body, headers=None, token=TOKEN):
+    headers = {'Content-Type': 'application/x-ndjson', 'Authorization': f'Bearer {token}', **(headers or {})}
+    return client.post('/carga/propiedad_renta', data=body, headers=headers)
+
+
+def test_rows_are_streamed_to_copy(fake_db, client, monkeypatch):
+    monkeypatch.setattr(main, 'BULK_LOAD_TOKEN', TOKEN)
+    fake_db.results['WITH upserted'] = [(5000, 0)]
+
+    response = post(client, ndjson(5000))
+    assert response.status_code == 200
+    assert response.get_json()['insertadas'] == 5000
+
+    connection = fake_db.opened[-1]
+    # COPY recibe bloques del tamaño que pide, no todo el cuerpo de una vez
+    assert len(connection.copied) > 1
+    assert max(len(chunk) for chunk in connection.copied) <= 8192
+    lines = ''.join(connection.copied).splitlines()
+    assert len(lines) == 5000
+    assert lines[0] == '1\t1\t1'
+
+
+def test_gzip_body(fake_db, client, monkeypatch):
+    monkeypatch.setattr(main, 'BULK_LOAD_TOKEN', TOKEN)
+    fake_db.results['WITH upserted'] = [(3, 0)]
+
+    response = post(client, gzip.compress(ndjson(3)), {'Content-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert ''.join(fake_db.opened[-1].copied).splitlines() == ['1\t1\t1', '2\t2\t2', '3\t3\t3']
+
+
+def test_corrupt_gzip_body_is_rejected(fake_db, client, monkeypatch):
+    monkeypatch.setattr(main, 'BULK_LOAD_TOKEN', TOKEN)
+    response = post(client, gzip.compress(ndjson(3))[:-12] + b'x' * 12, {'Content-Encoding': 'gzip'})
+    assert response.status_code == 400
+
+
+def test_unsupported_encoding_and_size_limit(fake_db, client, monkeypatch):
+    monkeypatch.setattr(main, 'BULK_LOAD_TOKEN', TOKEN)
+    assert post(client, ndjson(1), {'Content-Encoding': 'br'}).status_code == 415
+
+    monkeypatch.setattr(main, 'BULK_MAX_BODY_SIZE', 10)
+    assert post(client, ndjson(1)).status_code == 413
+    assert not fake_db.opened
+
+
+def test_invalid_token(fake_db, client, monkeypatch):
+    monkeypatch.setattr(main, 'BULK_LOAD_TOKEN', TOKEN)
+    assert post(client, ndjson(1), token='otro').status_code == 401
+    assert post(client, ndjson(1), headers={'Authorization': 'Bearer'}).status_code == 401
+
+
+def test_non_integral_numbers_are_row_errors():
+    spec = main.BULK_TABLES['propiedad_renta']
+    assert main.validate_bulk_row(spec, {'propiedad_id': 2.0, 'renta_id': '3'}) == {'propiedad_id': 2, 'renta_id': 3}
+    for value in (2.9, '2.9', float('inf')):
+        try:
+            main.validate_bulk_row(spec, {'propiedad_id': value, 'renta_id': 1})
+        except ValueError as e:
+            assert str(e).startswith('propiedad_id: valor inválido')
+        else:
+            raise AssertionError(f'{value!r} no fue rechazado')
+
+
+def test_values_outside_column_limits_are_row_errors(fake_db, client, monkeypatch):
+    monkeypatch.setattr(main, 'BULK_LOAD_TOKEN', TOKEN)
+    fake_db.results['WITH upserted'] = [(1, 0)]
+    body = '\n'.join(json.dumps(record) for record in (
+        {'propiedad_id': 1, 'renta_id': 99999999999},
+        {'propiedad_id': -2 ** 31, 'renta_id': 2 ** 31 - 1},
+        {'propiedad_id': 2 ** 31, 'renta_id': 1},
+    )).encode()
+
+    result = post(client, body).get_json()
+    assert [error['fila'] for error in result['errores']] == [1, 3]
+    assert 'fuera del rango de INT' in result['errores'][0]['error']
+    assert ''.join(fake_db.opened[-1].copied).splitlines() == [f'2\t{-2 ** 31}\t{2 ** 31 - 1}']
+
+
+def test_long_varchar_values_are_row_errors():
+    spec = main.BULK_TABLES['renta']
+    record = {'nombre_comercial': 'x' * 255, 'renta_iva_incluida': 1, 'inicio_vigencia': '2026-01-01', 'fin_vigencia_forzosa': '2027-01-01'}
+    assert main.validate_bulk_row(spec, record)['nombre_comercial'] == 'x' * 255
+    # incidencias es TEXT y no tiene límite
+    assert main.validate_bulk_row(spec, {**record, 'incidencias': 'x' * 1000})['incidencias'] == 'x' * 1000
+    try:
+        main.validate_bulk_row(spec, {**record, 'razon_social': 'x' * 256})
+    except ValueError as e:
+        assert str(e) == 'razon_social: el texto tiene 256 caracteres, el máximo es 255'
+    else:
+        raise AssertionError('razon_social de 256 caracteres no fue rechazada')
+
+
+def test_failed_write_returns_error_status(fake_db, client, monkeypatch):
+    monkeypatch.setattr(main, 'BULK_LOAD_TOKEN', TOKEN)
+    failures = {'data': main.psycopg2.DataError('integer out of range'), 'other': main.psycopg2.OperationalError('server closed the connection')}
+
+    for error, status in ((failures['data'], 422), (failures['other'], 500)):
+        def execute(self, query, params=None, error=error):
+            if 'WITH upserted' in query:
+                raise error
+
+        monkeypatch.setattr(FakeCursor, 'execute', execute)
+        response = post(client, ndjson(1))
+        assert response.status_code == status
+        assert response.get_json()['message'] == str(error)
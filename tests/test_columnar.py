@@ -0,0 +1,190 @@
+from datetime import datetime
+
+import pytest
+
+np = pytest.importorskip('numpy')
+import columnar  # noqa: E402
+
+import main  # noqa: E402
+
+
+def row(table, **values):
+    return tuple(values.get(column) for column, _ in columnar.SPECS[table]['columns'])
+
+
+def propiedad(id, **values):
+    return row('propiedad', id=id, **values)
+
+
+class FakeTable:
+    # Responde las consultas de ColumnarSnapshot: carga completa, delta (filas en changed) y lista de llaves
+    def __init__(self, rows, name='propiedad'):
+        self.name = name
+        self.rows = list(rows)
+        self.changed = []
+
+    def connect(self):
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, table):
+        self.table = table
+
+    def cursor(self):
+        return FakeCursor(self.table)
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, table):
+        self.table = table
+        self.result = []
+
+    def execute(self, query, params=None):
+        if 'LOCALTIMESTAMP' in query:
+            self.result = [(datetime(2026, 1, 1),)]
+        elif query == columnar.SPECS[self.table.name]['keys']:
+            self.result = [(row[0],) for row in self.table.rows]
+        elif params is not None:
+            self.result = list(self.table.changed)
+        else:
+            self.result = list(self.table.rows)
+
+    def fetchone(self):
+        return self.result[0]
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+def ids(result):
+    return [item['id'] for item in result['data']]
+
+
+def load(rows, name='propiedad'):
+    table = FakeTable(rows, name)
+    snapshot = columnar.ColumnarSnapshot(name, table.connect)
+    snapshot.refresh()
+    return table, snapshot
+
+
+PROPIEDADES = [
+    propiedad(5, clave='E', nombre='norte', superficie=float('nan'), anio_valor_comercial=2024, proyecto_id=1),
+    propiedad(2, clave='B', nombre='sur', superficie=0.0, anio_valor_comercial=None, proyecto_id=1),
+    propiedad(4, clave='D', nombre='norte', superficie=None, anio_valor_comercial=2023, proyecto_id=2),
+    propiedad(1, clave='A', nombre='norte', superficie=10.5, anio_valor_comercial=2024, proyecto_id=None),
+    propiedad(3, clave='C', nombre=None, superficie=10.5, anio_valor_comercial=2024, proyecto_id=2),
+]
+
+
+def test_rows_sorted_by_key_and_paginated():
+    _, snapshot = load(PROPIEDADES)
+    first = snapshot.page({}, ['id', 'clave'], 1, 2, 'exact')
+    assert first == {
+        'data': [{'id': 1, 'clave': 'A'}, {'id': 2, 'clave': 'B'}],
+        'page': 1,
+        'page_size': 2,
+        'has_more': True,
+        'total': 5
+    }
+    last = snapshot.page({}, ['id'], 3, 2, None)
+    assert ids(last) == [5]
+    assert last['has_more'] is False
+    assert last['total'] is None
+    assert snapshot.page({}, ['id'], 4, 2, 'exact') == {'data': [], 'page': 4, 'page_size': 2, 'has_more': False, 'total': 5}
+
+
+def test_equality_filters_are_combined():
+    _, snapshot = load(PROPIEDADES)
+    assert ids(snapshot.page({'nombre': 'norte'}, ['id'], 1, 10, None)) == [1, 4, 5]
+    # anio_valor_comercial y proyecto_id se resuelven con bitmaps, nombre con máscara
+    assert ids(snapshot.page({'nombre': 'norte', 'anio_valor_comercial': 2024}, ['id'], 1, 10, None)) == [1, 5]
+    assert ids(snapshot.page({'anio_valor_comercial': 2024, 'proyecto_id': 2}, ['id'], 1, 10, None)) == [3]
+    assert ids(snapshot.page({'nombre': 'oeste'}, ['id'], 1, 10, None)) == []
+    assert ids(snapshot.page({'anio_valor_comercial': 1999}, ['id'], 1, 10, None)) == []
+    assert ids(snapshot.page({'nombre': None, 'clave': 'C'}, ['id'], 1, 10, None)) == [3]
+
+
+def test_nulls_never_match_and_are_returned_as_none():
+    _, snapshot = load(PROPIEDADES)
+    # Las columnas nulas se guardan como 0 en el arreglo: no deben coincidir con un filtro = 0
+    assert ids(snapshot.page({'superficie': 0.0}, ['id'], 1, 10, None)) == [2]
+    assert ids(snapshot.page({'superficie': 10.5}, ['id'], 1, 10, None)) == [1, 3]
+    result = snapshot.page({'clave': 'C'}, ['nombre', 'proyecto_id', 'comentarios'], 1, 10, None)
+    assert result['data'] == [{'nombre': None, 'proyecto_id': 2, 'comentarios': None}]
+
+
+def test_nan_matches_nan_like_postgres():
+    _, snapshot = load(PROPIEDADES)
+    assert ids(snapshot.page({'superficie': float('nan')}, ['id'], 1, 10, None)) == [5]
+    value = snapshot.page({'clave': 'E'}, ['superficie'], 1, 10, None)['data'][0]['superficie']
+    assert value != value
+
+
+def test_unsupported_queries_fall_back_to_sql():
+    _, snapshot = load(PROPIEDADES)
+    assert snapshot.page({'latitud': 19.4}, ['id'], 1, 10, None) is None
+    assert snapshot.page({}, ['id', 'latitud'], 1, 10, None) is None
+    assert snapshot.page({'superficie': 'diez'}, ['id'], 1, 10, None) is None
+    assert columnar.ColumnarSnapshot('propiedad', FakeTable([]).connect).page({}, ['id'], 1, 10, None) is None
+
+
+def test_proyecto_order_puts_null_joins_last():
+    rows = [
+        row('proyecto', id=2, clave='P2', tiene_garantia=False, sociedad_id=None),
+        row('proyecto', id=1, clave='P1', tiene_garantia=True, sociedad_id=None, ubicacion_id=3),
+        row('proyecto', id=1, clave='P1', tiene_garantia=True, sociedad_id=7, ubicacion_id=3),
+        row('proyecto', id=1, clave='P1', tiene_garantia=True, sociedad_id=4, ubicacion_id=None),
+        row('proyecto', id=3, clave='P3', tiene_garantia=None),
+    ]
+    _, snapshot = load(rows, 'proyecto')
+    result = snapshot.page({}, ['id', 'sociedad_id', 'ubicacion_id'], 1, 10, None)['data']
+    assert [(item['id'], item['sociedad_id'], item['ubicacion_id']) for item in result] == [
+        (1, 4, None), (1, 7, 3), (1, None, 3), (2, None, None), (3, None, None)
+    ]
+    # tiene_garantia = false no incluye los NULL; 'sociedad' se traduce a sociedad_id
+    assert ids(snapshot.page({'tiene_garantia': False}, ['id'], 1, 10, None)) == [2]
+    assert ids(snapshot.page({'tiene_garantia': True, 'sociedad': 7}, ['id'], 1, 10, None)) == [1]
+
+
+def test_delta_merges_changes_and_drops_deleted_rows():
+    table, snapshot = load(PROPIEDADES)
+    changed = propiedad(2, clave='B', nombre='norte', superficie=0.0, proyecto_id=1)
+    added = propiedad(9, clave='Z', nombre='este', proyecto_id=3)
+    table.rows = [changed if item[0] == 2 else item for item in table.rows if item[0] != 4] + [added]
+    table.changed = [changed, added]
+    snapshot.refresh()
+
+    assert ids(snapshot.page({}, ['id'], 1, 10, 'exact')) == [1, 2, 3, 5, 9]
+    assert ids(snapshot.page({'nombre': 'norte'}, ['id'], 1, 10, None)) == [1, 2, 5]
+    # Valores nuevos del diccionario y del bitmap quedan disponibles después del delta
+    assert ids(snapshot.page({'nombre': 'este', 'proyecto_id': 3}, ['id'], 1, 10, None)) == [9]
+    assert ids(snapshot.page({'clave': 'D'}, ['id'], 1, 10, None)) == []
+
+
+def test_boolean_filter_parses_false():
+    with main.app.test_request_context('/proyectos/?tiene_garantia=false'):
+        assert main.proyectos_parser.parse_args()['tiene_garantia'] is False
+    assert columnar.query_value(False) == 'false'
+
+
+def test_generation_change_forces_full_reload():
+    table = FakeTable([propiedad(1, nombre='a'), propiedad(2, nombre='b')])
+    generation = [0]
+    snapshot = columnar.ColumnarSnapshot('propiedad', table.connect, generation=lambda: generation[0])
+    snapshot.refresh()
+
+    # Fila escrita por una transacción larga: su updated_at queda fuera de la ventana del delta
+    table.rows[1] = propiedad(2, nombre='c')
+    snapshot.refresh()
+    assert snapshot.page({'nombre': 'c'}, ['id'], 1, 10, None)['data'] == []
+
+    generation[0] += 1
+    snapshot.refresh()
+    assert ids(snapshot.page({'nombre': 'c'}, ['id'], 1, 10, None)) == [2]
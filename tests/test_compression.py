@@ -0,0 +1,70 @@
+import gzip
+import json
+
+import pytest
+
+import main
+
+ROWS = [(index, index / 100, '2026-01-01', '2026-01-01') for index in range(1, 101)]
+
+
+@pytest.fixture
+def cached_client(fake_db, monkeypatch):
+    fake_db.results['FROM sociedad'] = ROWS
+    monkeypatch.setattr(main, 'response_cache', main.ResponseCache(60, 16))
+    monkeypatch.setattr(main, 'admission_gates', {})
+    return main.app.test_client()
+
+
+def test_negotiates_encoding_and_sets_vary(cached_client):
+    response = cached_client.get('/sociedades/', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert len(json.loads(gzip.decompress(response.data))['data']) == 100
+
+    identity = cached_client.get('/sociedades/', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in identity.headers
+    assert 'Accept-Encoding' in identity.headers['Vary']
+    assert len(identity.get_json()['data']) == 100
+
+
+def test_quality_values_pick_the_preferred_encoding(cached_client):
+    response = cached_client.get('/sociedades/', headers={'Accept-Encoding': 'gzip;q=1.0, br;q=0.5, zstd;q=0'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+
+
+def test_small_bodies_are_not_compressed(cached_client, monkeypatch):
+    monkeypatch.setattr(main, 'COMPRESSION_MIN_SIZE', 10 ** 6)
+    response = cached_client.get('/sociedades/', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+
+def test_cache_hit_returns_stored_bytes_without_recompressing(cached_client, fake_db, monkeypatch):
+    calls = []
+    compress = main.COMPRESSORS['gzip']
+
+    def counting(data):
+        calls.append(len(data))
+        return compress(data)
+
+    monkeypatch.setitem(main.COMPRESSORS, 'gzip', counting)
+    first = cached_client.get('/sociedades/?page_size=100', headers={'Accept-Encoding': 'gzip'})
+    second = cached_client.get('/sociedades/?page_size=100', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'X-Cache' not in first.headers
+    assert second.headers['X-Cache'] == 'HIT'
+    assert second.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in second.headers['Vary']
+    assert second.data == first.data
+    assert len(calls) == 1
+    assert sum(len(connection.queries) for connection in fake_db.opened) == 2
+
+    # Cada codificación es una entrada distinta
+    plain = cached_client.get('/sociedades/?page_size=100', headers={'Accept-Encoding': 'identity'})
+    assert 'X-Cache' not in plain.headers
+
+
+def test_errors_are_not_cached(cached_client):
+    assert cached_client.get('/sociedades/?page=0').status_code == 400
+    assert 'X-Cache' not in cached_client.get('/sociedades/?page=0').headers
@@ -0,0 +1,51 @@
+import main
+from conftest import FakeCursor
+
+
+def page_query(fake_db):
+    return next(query for connection in fake_db.opened for query in connection.queries if 'LIMIT' in query)
+
+
+def test_default_projection_skips_geo_columns(fake_db, client):
+    response = client.get('/propiedades/')
+    assert response.status_code == 200
+    assert 'latitud' not in page_query(fake_db)
+
+
+def test_geo_columns_available_through_fields(fake_db, client):
+    response = client.get('/ubicacion/', query_string={'fields': 'id,latitud,longitud'})
+    assert response.status_code == 200
+    assert 'SELECT id, latitud, longitud' in page_query(fake_db)
+
+
+def test_geo_modes_return_coordinates(fake_db, client):
+    response = client.get('/ubicacion/', query_string={'bbox': '-100,19,-99,20'})
+    assert response.status_code == 200
+    assert 'updated_at, latitud, longitud' in page_query(fake_db)
+
+
+def test_missing_geo_columns_fail_with_clear_error(fake_db, client, monkeypatch):
+    def execute(self, query, params=None):
+        if 'latitud' in query:
+            raise main.UndefinedColumn('column "latitud" does not exist')
+
+    monkeypatch.setattr(FakeCursor, 'execute', execute)
+    response = client.get('/ubicacion/', query_string={'lat': 19.4, 'lon': -99.1})
+    assert response.status_code == 501
+    assert 'ALTER TABLE' in response.get_json()['message']
+
+
+def test_postgis_bbox_uses_indexed_expression_with_exact_recheck(monkeypatch):
+    bbox = {'bbox': '-100,19,-99,20'}
+    _, plain_params, _, _ = main.build_geo_filter(bbox)
+
+    monkeypatch.setattr(main, 'GEO_BACKEND', 'postgis')
+    condition, params, order, _ = main.build_geo_filter(bbox)
+    index_check, exact = condition.split(' AND ', 1)
+    # && sobre la geometría usa el índice GiST; la geografía tendría bordes geodésicos y no coincidiría con la caja
+    assert index_check == f"{main.GEO_GEOMETRY} && ST_MakeEnvelope(%s, %s, %s, %s, 4326)"
+    assert '::geography' not in index_check
+    # El predicado exacto es el mismo que usa el modo plain, con los mismos parámetros
+    assert exact == 'latitud BETWEEN %s AND %s AND longitud BETWEEN %s AND %s'
+    assert params == (-100.0, 19.0, -99.0, 20.0) + plain_params
+    assert order == ''
@@ -0,0 +1,21 @@
+import main
+
+
+def executed(fake_db):
+    return [query for connection in fake_db.opened for query in connection.queries]
+
+
+def test_estimated_total_uses_catalog_for_single_table(fake_db, client):
+    fake_db.results['pg_class'] = [(42,)]
+    response = client.get('/sociedades/', query_string={'total': 'estimated'})
+    assert response.get_json()['total'] == 42
+    assert not any(query.startswith('EXPLAIN') for query in executed(fake_db))
+
+
+def test_estimated_total_for_proyectos_counts_join_rows(fake_db, client):
+    # reltuples de proyecto cuenta proyectos; la página recorre una fila por sociedad/ubicación/estatus
+    fake_db.results['pg_class'] = [(10,)]
+    fake_db.results['EXPLAIN'] = [([{'Plan': {'Plan Rows': 37}}],)]
+    response = client.get('/proyectos/', query_string={'total': 'estimated'})
+    assert response.get_json()['total'] == 37
+    assert not any('pg_class' in query for query in executed(fake_db))
@@ -0,0 +1,46 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import main
+
+
+def test_connections_are_reused_under_concurrency(fake_db, client):
+    fake_db.delay = 0.002
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        responses = list(executor.map(lambda _: client.get('/sociedades/'), range(200)))
+
+    assert all(response.status_code == 200 for response in responses)
+    # Cada hilo necesita a lo sumo una conexión a la vez y ninguna se cierra al devolverla
+    assert 1 <= len(fake_db.opened) <= 8
+    assert not any(connection.closed for connection in fake_db.opened)
+    assert sum(len(connection.queries) for connection in fake_db.opened) == 400
+
+
+def test_exhausted_pool_waits_for_a_connection(fake_db):
+    pool = main.BlockingConnectionPool(0, 1, 2)
+    held = pool.getconn()
+
+    def release():
+        time.sleep(0.2)
+        pool.putconn(held)
+
+    releaser = threading.Thread(target=release)
+    releaser.start()
+    assert pool.getconn() is held
+    releaser.join()
+    assert len(fake_db.opened) == 1
+
+
+def test_exhausted_pool_times_out(fake_db, monkeypatch):
+    pool = main.BlockingConnectionPool(0, 1, 0.1)
+    monkeypatch.setattr(main, 'get_connection_pool', lambda: pool)
+    pool.getconn()
+
+    started = time.monotonic()
+    with pytest.raises(main.ServiceUnavailable):
+        with main.pooled_connection():
+            pass
+    assert time.monotonic() - started >= 0.1
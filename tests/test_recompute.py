@@ -0,0 +1,69 @@
+import math
+
+import pytest
+
+np = pytest.importorskip('numpy')
+import recompute  # noqa: E402
+
+# anio: (tipo_cambio, tasa_predial, recargo_anual)
+TARIFFS = {2024: (20.0, 0.01, 0.1), 2023: (18.0, 0.02, 0.1)}
+MAX_YEARS = 4
+
+
+def factors():
+    return recompute.debt_factors(TARIFFS, 2024, MAX_YEARS)
+
+
+def test_debt_factors_accumulate_rate_and_surcharge():
+    result = factors()
+    assert len(result) == MAX_YEARS + 1
+    assert result[0] == 0
+    assert result[1] == pytest.approx(0.01)
+    # 2024 sin recargo + 2023 con un año de recargo
+    assert result[2] == pytest.approx(0.01 + 0.02 * 1.1)
+    # 2022 no tiene tarifa: ese número de años y los siguientes no se pueden calcular
+    assert np.isnan(result[3:]).all()
+
+
+def chunk(*rows):
+    # (id, valor_comercial, base_predial, anios_pend_predial, valor_comercial_usd, adeudo_predial)
+    return recompute.recompute_chunk(list(rows), TARIFFS[2024][0], factors())
+
+
+def test_only_changed_rows_are_returned():
+    values, skipped = chunk(
+        (1, 1000.0, 500.0, 1, 50.0, 5.0),      # ya está al día
+        (2, 2000.0, 500.0, 1, 50.0, 5.0),      # cambia solo el valor en USD
+        (3, 1000.0, 500.0, 2, 50.0, 5.0),      # cambia solo el adeudo
+    )
+    assert values == [(2, 100.0, 5.0), (3, 50.0, 16.0)]
+    assert skipped == 0
+
+
+def test_zero_pending_years_means_no_debt():
+    values, skipped = chunk((1, 1000.0, 500.0, 0, 50.0, 12.5))
+    assert values == [(1, 50.0, 0.0)]
+    assert skipped == 0
+
+
+def test_missing_tariff_years_keep_old_debt_and_are_counted():
+    values, skipped = chunk(
+        (1, 1000.0, 500.0, 3, 50.0, 7.0),              # 2022 no tiene tarifa
+        (2, 1000.0, 500.0, MAX_YEARS + 1, 50.0, 9.0),  # más años que --max-anios
+        (3, 1000.0, 500.0, -1, 50.0, 4.0),             # valor inválido
+        (4, 3000.0, 500.0, 3, 50.0, 7.0),              # conserva el adeudo pero el USD cambia
+    )
+    assert values == [(4, 150.0, 7.0)]
+    assert skipped == 4
+
+
+def test_nulls_are_kept_as_nulls():
+    values, skipped = chunk(
+        (1, None, 500.0, None, None, None),     # sin valor comercial ni años: nada que escribir
+        (2, 1000.0, 500.0, None, 50.0, 3.0),    # sin años pendientes se conserva el adeudo capturado
+        (3, None, None, 1, 10.0, 2.0),          # sin valor ni base: ambos resultados son NULL
+        (4, 1000.0, 500.0, 1, None, None),      # valores anteriores NULL
+    )
+    assert values == [(3, None, None), (4, 50.0, 5.0)]
+    assert skipped == 0
+    assert not any(isinstance(value, float) and math.isnan(value) for row in values for value in row)
@@ -0,0 +1,66 @@
+import os
+import time
+
+import main
+import shared_cache
+from shared_cache import SharedResponseCache
+
+
+def new_cache(ttl=60, **kwargs):
+    return SharedResponseCache(ttl, slots=8, slot_size=4096, local=main.ResponseCache(ttl, 16), **kwargs)
+
+
+def test_round_trip_and_clear():
+    cache = new_cache()
+    cache.set(('/sociedades/', 'gzip'), (b'cuerpo', 'application/json', 'gzip'))
+    cache.set(('/grande/', None), (b'x' * 8192, 'application/json', None))
+    assert cache.get(('/sociedades/', 'gzip')) == (b'cuerpo', 'application/json', 'gzip')
+    assert cache.get(('/grande/', None))[0] == b'x' * 8192
+    assert cache.get(('/sociedades/', None)) is None
+
+    generation = cache.generation
+    cache.clear()
+    assert cache.generation == generation + 1
+    assert cache.get(('/sociedades/', 'gzip')) is None
+    assert cache.get(('/grande/', None)) is None
+
+
+def test_expired_entries_are_misses():
+    cache = new_cache(ttl=0.05)
+    cache.set('llave', 'valor')
+    assert cache.get('llave') == 'valor'
+    time.sleep(0.1)
+    assert cache.get('llave') is None
+
+
+def test_slot_being_written_is_a_miss():
+    cache = new_cache()
+    cache.set('llave', 'valor')
+    _, offset = cache._slot('llave')
+    sequence = shared_cache.SEQUENCE.unpack_from(cache._memory, offset)[0]
+    shared_cache.SEQUENCE.pack_into(cache._memory, offset, sequence + 1)
+    assert cache.get('llave') is None
+
+    # El siguiente escritor recupera el slot aunque el anterior lo haya dejado a medias
+    cache.set('llave', 'otro')
+    assert cache.get('llave') == 'otro'
+
+
+def test_dead_lock_holder_does_not_block_workers():
+    cache = new_cache()
+    cache.set('antes', 'valor')
+
+    pid = os.fork()
+    if pid == 0:
+        cache._lock.acquire()
+        os._exit(0)
+    os.waitpid(pid, 0)
+
+    started = time.monotonic()
+    assert cache.get('antes') == 'valor'
+    cache.set('despues', 'valor')
+    assert cache.get('despues') == 'valor'
+    cache.clear()
+    assert cache.get('antes') is None
+    assert cache.get('despues') is None
+    assert time.monotonic() - started < 1